@@ -0,0 +1,75 @@
+"""
+`cmd_async` with one thread per command (as before 1.2.7) versus the
+bounded `CommandExecutor`.
+
+    python -m benchmark.cmd_async [COMMANDS]
+
+Both start the same number of commands at once and wait for all of them,
+the wall time and the highest number of live threads are printed.
+"""
+import sys
+import time
+import threading
+
+from concurrent.futures import wait
+
+from gqylpy_ssh import GqylpySSH, CommandExecutor
+
+from .server import SSHServer
+
+
+def watch(peak: list, done: threading.Event):
+    while not done.wait(.01):
+        peak[0] = max(peak[0], threading.active_count())
+
+
+def measure(start_all, n: int) -> tuple:
+    peak, done = [threading.active_count()], threading.Event()
+    watcher = threading.Thread(target=watch, args=(peak, done))
+    watcher.start()
+    begin = time.perf_counter()
+    start_all(n)
+    elapsed: float = time.perf_counter() - begin
+    done.set()
+    watcher.join()
+    return elapsed, peak[0]
+
+
+def main(commands: int):
+    with SSHServer() as server:
+        ssh = GqylpySSH(
+            *server.address,
+            username     ='bench',
+            password     ='bench',
+            allow_agent  =False,
+            look_for_keys=False,
+            executor     =CommandExecutor(max_workers=32)
+        )
+
+        def threads(n: int):
+            started = [
+                threading.Thread(target=ssh.cmd, args=('true',), daemon=True)
+                for _ in range(n)
+            ]
+            for thread in started:
+                thread.start()
+            for thread in started:
+                thread.join()
+
+        def executor(n: int):
+            futures = [ssh.cmd_async('true') for _ in range(n)]
+            wait(futures)
+            assert all(f.result().status for f in futures)
+
+        print(f'{commands} commands')
+        print(f'{"mode":<18} {"seconds":>8} {"peak threads":>13}')
+        for name, start_all in ('thread per call', threads), \
+                ('CommandExecutor', executor):
+            elapsed, peak = measure(start_all, commands)
+            print(f'{name:<18} {elapsed:>8.2f} {peak:>13}')
+
+        ssh.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 2000)
@@ -0,0 +1,50 @@
+"""
+Micro-benchmark of the `Command` accessors on a multi-MB output.
+
+    python -m benchmark.command [MEGABYTES]
+
+"first" is the cost of the first predicate, which decodes the output, and
+"repeated" is the average cost of each of the following predicates, which
+reuse the cached text.
+"""
+import sys
+import time
+
+from gqylpy_ssh import Command
+
+REPEAT = 50
+
+
+def measure(func) -> tuple:
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return first, (time.perf_counter() - start) / REPEAT
+
+
+def main(megabytes: int):
+    line = b'root   1234  0.0  0.1 169084 13204 ?  Ss  10:00  0:01 /sbin/init\n'
+    stdout: bytes = line * (megabytes * (1 << 20) // len(line))
+    stderr: bytes = b'warning: something\n'
+
+    cases = {
+        'output':       lambda c: c.output,
+        'contain':      lambda c: c.contain('/usr/bin/none'),
+        'contain(i)':   lambda c: c.contain('INIT', ignore_case=True),
+        'output_if':    lambda c: c.output_if_contain_string_else_raise('init'),
+        'output_else':  lambda c: c.output_else_raise()
+    }
+
+    print(f'{len(stdout) / (1 << 20):.1f} MiB of output, {REPEAT} repeats')
+    print(f'{"accessor":<22} {"first(ms)":>10} {"repeated(ms)":>13}')
+    for name, func in cases.items():
+        c = Command('ps aux', stdout, stderr, exit_status=0)
+        first, repeated = measure(lambda: func(c))
+        print(f'{name:<22} {first * 1e3:>10.3f} {repeated * 1e3:>13.4f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 8)
@@ -0,0 +1,90 @@
+"""
+Bytes on the wire of large outputs with `cmd(..., compress=...)`, versus
+the plain output and the transport-level zlib of `GqylpySSH(compress=True)`.
+
+    python -m benchmark.compress [--mbit N]
+
+The bytes are counted on the TCP socket, so they include the SSH framing,
+MACs and padding. The local time is measured against the in-process server,
+the time on a `--mbit` link is estimated from it and the bytes.
+"""
+import sys
+import time
+import socket
+import argparse
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+OUTPUTS = {
+    'numbers': 'seq 1 3000000',
+    'listing': 'ls -lR /usr 2>/dev/null | head -c 16777216',
+    'random':  'head -c 8388608 /dev/urandom'
+}
+
+MODES = {
+    'plain':          ({}, None),
+    'transport zlib': ({'compress': True}, None),
+    'gzip':           ({}, 'gzip'),
+    'zstd':           ({}, 'zstd')
+}
+
+
+class CountingSocket:
+
+    def __init__(self, sock: socket.socket):
+        self.sock     = sock
+        self.received = 0
+
+    def recv(self, size: int) -> bytes:
+        data: bytes = self.sock.recv(size)
+        self.received += len(data)
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self.sock, name)
+
+
+def measure(server: SSHServer, command: str, params: dict, compress) -> tuple:
+    sock = CountingSocket(socket.create_connection(server.address))
+    ssh = GqylpySSH(
+        *server.address,
+        username     ='bench',
+        password     ='bench',
+        allow_agent  =False,
+        look_for_keys=False,
+        sock         =sock,
+        **params
+    )
+    ssh.cmd('true', compress=compress)  # The probe of the programs.
+    before: int = sock.received
+    start = time.perf_counter()
+    c = ssh.cmd(command, compress=compress)
+    elapsed: float = time.perf_counter() - start
+    size: int = len(c.stdout)
+    ssh.close()
+    return sock.received - before, elapsed, size
+
+
+def main(args):
+    with SSHServer() as server:
+        print(f'{"output":<8} {"mode":<15} {"output MiB":>10} '
+              f'{"wire MiB":>9} {"ratio":>6} {"local s":>8} '
+              f'{f"{args.mbit:g}Mbit/s s":>11}')
+        for output, command in OUTPUTS.items():
+            for mode, (params, compress) in MODES.items():
+                wire, elapsed, size = measure(
+                    server, command, params, compress
+                )
+                link: float = max(elapsed, wire * 8 / (args.mbit * 1e6))
+                print(f'{output:<8} {mode:<15} {size / 2**20:>10.2f} '
+                      f'{wire / 2**20:>9.2f} {size / wire:>6.2f} '
+                      f'{elapsed:>8.2f} {link:>11.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmark.compress')
+    parser.add_argument('--mbit', type=float, default=10,
+                        help='bandwidth of the estimated link')
+    main(parser.parse_args(sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+How long a stuck host holds the caller of `HostGroup.cmd`, with a per-read
+`timeout` versus an overall `deadline`.
+
+    python -m benchmark.deadline [HOSTS]
+
+One of the hosts prints a line every second and never ends its command, so
+no read ever times out. With `timeout` alone the caller waits forever (it is
+given up after `LIMIT` seconds here), with `deadline` it gets the results of
+the other hosts and a `socket.timeout` for the stuck one in time.
+"""
+import sys
+import time
+import threading
+
+import paramiko
+
+from gqylpy_ssh import GqylpySSH, HostGroup
+
+from .server import SSHServer
+
+LIMIT = 10
+
+
+class StuckServer(SSHServer):
+
+    def execute(self, channel: paramiko.Channel, command: str, env=None):
+        try:
+            while True:
+                channel.sendall(b'.\n')
+                time.sleep(1)
+        except OSError:
+            pass
+
+
+def run(group: HostGroup, **kw) -> tuple:
+    results, finished = [], threading.Event()
+
+    def collect():
+        results.extend(group.cmd('echo ok', **kw))
+        finished.set()
+
+    start = time.perf_counter()
+    threading.Thread(target=collect, daemon=True).start()
+    finished.wait(LIMIT)
+    return time.perf_counter() - start, results
+
+
+def main(hosts: int):
+    servers = [StuckServer()] + [SSHServer() for _ in range(hosts - 1)]
+    print(f'{hosts} hosts, 1 stuck')
+    print(f'{"mode":<12} {"seconds":>8} {"results":>8} {"timeouts":>9}')
+    for name, kw in ('timeout=2', {'timeout': 2}), \
+            ('deadline=2', {'deadline': 2}):
+        group = HostGroup([
+            GqylpySSH(
+                *server.address,
+                username     ='bench',
+                password     ='bench',
+                allow_agent  =False,
+                look_for_keys=False
+            ) for server in servers
+        ])
+        elapsed, results = run(group, **kw)
+        ok: int = sum(not isinstance(r, Exception) for _, r in results)
+        timeouts: int = sum(isinstance(r, TimeoutError) for _, r in results)
+        note: str = ' (given up)' if elapsed >= LIMIT else ''
+        print(f'{name:<12} {elapsed:>8.2f} {ok:>8} {timeouts:>9}{note}')
+        group.close()
+    for server in servers:
+        server.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 8)
@@ -0,0 +1,49 @@
+"""
+Fan-out benchmark: wall time of `HostGroup.cmd` as the host count grows.
+
+    python -m benchmark.hostgroup [HOSTS ...]
+
+Each "host" is a separate connection to the in-process server. The command
+sleeps on the remote side, so with enough workers the wall time should stay
+close to a single command regardless of the host count.
+"""
+import sys
+import time
+
+from gqylpy_ssh import HostGroup
+
+from .server import SSHServer
+
+COMMAND = 'sleep 0.2'
+
+
+def main(counts: list):
+    with SSHServer() as server:
+        host = '%s:%d' % server.address
+        print(f'{"hosts":>6} {"connect(s)":>11} {"cmd(s)":>8} {"errors":>7}')
+        for count in counts:
+            start = time.perf_counter()
+            group = HostGroup(
+                [host] * count,
+                connect_workers=32,
+                cmd_workers    =count,
+                username       ='bench',
+                password       ='bench',
+                allow_agent    =False,
+                look_for_keys  =False
+            )
+            connected = time.perf_counter()
+            errors = sum(
+                1 for _, c in group.cmd(COMMAND)
+                if isinstance(c, Exception) or not c.status
+            )
+            finished = time.perf_counter()
+            group.close()
+            print(
+                f'{count:>6} {connected - start:>11.3f} '
+                f'{finished - connected:>8.3f} {errors:>7}'
+            )
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or [1, 10, 50, 100])
@@ -0,0 +1,67 @@
+"""
+Connecting to targets behind a bastion.
+
+    python -m benchmark.jump [TARGETS] [RTT_MS]
+
+"per-target" opens a new bastion connection for every target and passes its
+"direct-tcpip" channel as `sock`, as had to be done by hand before. "shared"
+uses `jump=...`, all targets share one bastion connection. The bastion link
+has RTT_MS (default 20) of round trip time.
+"""
+import sys
+import time
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+AUTH = dict(
+    username     ='bench',
+    password     ='bench',
+    allow_agent  =False,
+    look_for_keys=False
+)
+
+
+def per_target(bastion: tuple, target: tuple) -> list:
+    gobjs = []
+    jump = GqylpySSH(*bastion, **AUTH)
+    sock = jump.get_transport().open_channel(
+        'direct-tcpip', target, ('127.0.0.1', 0)
+    )
+    gobjs.append(jump)
+    gobjs.append(GqylpySSH(*target, sock=sock, **AUTH))
+    return gobjs
+
+
+def main(targets: int, rtt: float):
+    with SSHServer(rtt=rtt) as bastion, SSHServer() as target:
+        print(f'{targets} targets, bastion rtt {rtt * 1e3:.0f} ms')
+        print(f'{"mode":<12} {"seconds":>8} {"handshakes":>11}')
+
+        start = time.perf_counter()
+        gobjs = []
+        for _ in range(targets):
+            gobjs += per_target(bastion.address, target.address)
+        elapsed = time.perf_counter() - start
+        print(f'{"per-target":<12} {elapsed:>8.2f} {len(gobjs):>11}')
+        for gobj in gobjs:
+            gobj.close()
+
+        start = time.perf_counter()
+        jump = GqylpySSH(*bastion.address, **AUTH)
+        gobjs = [
+            GqylpySSH(*target.address, jump=jump, **AUTH)
+            for _ in range(targets)
+        ]
+        elapsed = time.perf_counter() - start
+        print(f'{"shared":<12} {elapsed:>8.2f} {len(gobjs) + 1:>11}')
+        for gobj in gobjs + [jump]:
+            gobj.close()
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if sys.argv[1:] else 20,
+        float(sys.argv[2]) / 1e3 if sys.argv[2:] else 0.02
+    )
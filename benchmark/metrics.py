@@ -0,0 +1,68 @@
+"""
+Cost of the command instrumentation of `GqylpySSH(..., metrics=...)`.
+
+    python -m benchmark.metrics [COMMANDS]
+
+The same commands run with metrics disabled, enabled, and enabled with a
+hook, in alternating rounds so that the drift of the local server is spread
+over the three. The cost of a span alone (created, timed and aggregated
+without a command) is printed last.
+"""
+import sys
+import time
+
+from gqylpy_ssh import GqylpySSH, Metrics
+
+from .server import SSHServer
+
+
+def main(commands: int):
+    with SSHServer() as server:
+        spans = []
+        variants = {
+            'disabled'    : None,
+            'enabled'     : Metrics(),
+            'enabled+hook': Metrics(hooks=[spans.append])
+        }
+        gobjs = {
+            name: GqylpySSH(
+                *server.address,
+                username     ='bench',
+                password     ='bench',
+                allow_agent  =False,
+                look_for_keys=False,
+                metrics      =metrics
+            ) for name, metrics in variants.items()
+        }
+        elapsed = dict.fromkeys(gobjs, 0)
+        rounds = 10
+        for _ in range(rounds):
+            for name, ssh in gobjs.items():
+                start = time.perf_counter()
+                for _ in range(commands // rounds):
+                    ssh.cmd('echo x')
+                elapsed[name] += time.perf_counter() - start
+
+        print(f'{"metrics":<14} {"ms/cmd":>7}')
+        for name, seconds in elapsed.items():
+            print(f'{name:<14} {seconds / commands * 1000:>7.3f}')
+
+        metrics = Metrics()
+        ssh: GqylpySSH = gobjs['enabled']
+        n = 100000
+        start = time.perf_counter()
+        for _ in range(n):
+            with metrics.span(ssh, 'echo x') as span:
+                span.mark('channel_open')
+                for _ in span.received([(1, b'x\n')]):
+                    pass
+                span.exit_status = 0
+        print(f'span alone: {(time.perf_counter() - start) / n * 1e6:.1f}us')
+        print(metrics.to_prometheus().splitlines()[-1])
+
+        for ssh in gobjs.values():
+            ssh.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 2000)
@@ -0,0 +1,55 @@
+"""
+Cost of creating many clients that share one passphrase-protected key.
+
+    python -m benchmark.pkey [CLIENTS]
+
+A bcrypt-protected Ed25519 key is written to a temporary file, then CLIENTS
+`AsyncGqylpySSH` instances are created with it (they do not connect). The
+key is decrypted once and cached, "paramiko" decrypts it for each client as
+`Ed25519Key.from_private_key_file` would.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import paramiko
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from gqylpy_ssh import AsyncGqylpySSH
+
+PASSWORD = 'bench'
+
+
+def main(clients: int):
+    fd, path = tempfile.mkstemp(prefix='gqylpy-pkey-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(ed25519.Ed25519PrivateKey.generate().private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.OpenSSH,
+            serialization.BestAvailableEncryption(PASSWORD.encode())
+        ))
+    try:
+        start = time.perf_counter()
+        for _ in range(min(clients, 10)):
+            paramiko.Ed25519Key.from_private_key_file(path, PASSWORD)
+        naive = (time.perf_counter() - start) / min(clients, 10) * clients
+
+        start = time.perf_counter()
+        for _ in range(clients):
+            AsyncGqylpySSH(
+                '127.0.0.1', key_filename=path, key_password=PASSWORD
+            )
+        cached = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    print(f'{clients} clients')
+    print(f'paramiko (estimated) {naive:>8.2f} s')
+    print(f'cached               {cached:>8.2f} s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 1000)
@@ -0,0 +1,106 @@
+"""
+The effect of each connection profile, `GqylpySSH(profile=...)`, on bulk
+throughput and on the latency of small commands.
+
+    python -m benchmark.profile [--rtt SECONDS] [--mbit N ...] [--mib N]
+
+"local" is the in-process server, where the cost of paramiko itself (the
+cipher, the MAC and the per-packet work) is the limit. Each link adds the
+`--rtt` and one `--mbit` bandwidth with a router queue, where the window
+matters: a window smaller than bandwidth x rtt cannot fill the link, and
+the bytes of a larger one wait in the queue. "echo" is the median time of
+`echo` on the link, alone and while a download runs on the same
+connection, its reply waits behind the bulk data queued on the link.
+"""
+import sys
+import time
+import argparse
+import statistics
+import threading
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+PROFILES = None, 'throughput', 'low-latency'
+
+
+def connect(server: SSHServer, profile: str) -> GqylpySSH:
+    return GqylpySSH(
+        *server.address,
+        username     ='bench',
+        password     ='bench',
+        allow_agent  =False,
+        look_for_keys=False,
+        profile      =profile
+    )
+
+
+def download(ssh: GqylpySSH, mib: int) -> float:
+    start = time.perf_counter()
+    size = 0
+    for _, chunk in ssh.stream(f'head -c {mib << 20} /dev/zero').chunks():
+        size += len(chunk)
+    assert size == mib << 20
+    return size / 2**20 / (time.perf_counter() - start)
+
+
+def echo(ssh: GqylpySSH, n: int) -> float:
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        ssh.cmd('echo')
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def echo_under_load(ssh: GqylpySSH, n: int) -> float:
+    # The download is started first and runs until the echoes are done.
+    stream = ssh.stream('cat /dev/zero')
+    reader = threading.Thread(target=lambda: all(stream.chunks()))
+    reader.start()
+    time.sleep(1)
+    try:
+        return echo(ssh, n)
+    finally:
+        stream.close()
+        reader.join()
+
+
+def main(args):
+    with SSHServer() as server:
+        print(f'{"profile":<12} {"local MiB/s":>12}')
+        for profile in PROFILES:
+            ssh = connect(server, profile)
+            rate: float = statistics.median(
+                download(ssh, args.mib) for _ in range(3)
+            )
+            ssh.close()
+            print(f'{profile or "(none)":<12} {rate:>12.1f}')
+
+    for mbit in args.mbit:
+        bdp: float = mbit / 8 * 1e6 * args.rtt / 2**20
+        print(f'\nlink: rtt {args.rtt * 1000:g}ms, {mbit:g}Mbit/s, '
+              f'bandwidth x rtt {bdp:.2f} MiB')
+        print(f'{"profile":<12} {"link MiB/s":>11} {"echo ms":>8} '
+              f'{"under load":>11}')
+        with SSHServer(rtt=args.rtt, mbit=mbit) as server:
+            for profile in PROFILES:
+                ssh = connect(server, profile)
+                rate: float = download(ssh, args.mib)
+                idle: float = echo(ssh, 10)
+                loaded: float = echo_under_load(ssh, 10)
+                ssh.close()
+                print(f'{profile or "(none)":<12} {rate:>11.1f} '
+                      f'{idle:>8.0f} {loaded:>11.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmark.profile')
+    parser.add_argument('--rtt', type=float, default=.05,
+                        help='round trip time of the links in seconds')
+    parser.add_argument('--mbit', type=float, nargs='+', default=[1000, 100],
+                        help='bandwidth of each link in Mbit/s')
+    parser.add_argument('--mib', type=int, default=32,
+                        help='MiB downloaded for the throughput')
+    main(parser.parse_args(sys.argv[1:]))
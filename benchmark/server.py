@@ -0,0 +1,418 @@
+"""
+An in-process SSH server used by the benchmarks, it is a stand-in for a real
+sshd built on `paramiko.ServerInterface`. Any username/password is accepted,
+exec and shell requests are run by the local shell, the "sftp" subsystem
+serves the local file system, and "direct-tcpip" channels are forwarded, so
+the server can be used as a jump host.
+
+    >>> with SSHServer() as server:
+    ...     ssh = GqylpySSH(*server.address, username='u', password='p')
+"""
+import os
+import time
+import queue
+import signal
+import logging
+import socket
+import threading
+import subprocess
+
+import paramiko
+
+from paramiko.common import MSG_CHANNEL_REQUEST
+from paramiko.common import cMSG_CHANNEL_REQUEST
+
+logging.getLogger('paramiko').addHandler(logging.NullHandler())
+
+
+def send_exit_signal(channel: paramiko.Channel, name: str):
+    m = paramiko.Message()
+    m.add_byte(cMSG_CHANNEL_REQUEST)
+    m.add_int(channel.remote_chanid)
+    m.add_string('exit-signal')
+    m.add_boolean(False)
+    m.add_string(name)
+    m.add_boolean(False)
+    m.add_string('')
+    m.add_string('')
+    channel.transport._send_user_message(m)
+
+
+def _handle_channel_request(channel: paramiko.Channel, m: paramiko.Message):
+    position: int = m.packet.tell()
+    if m.get_text() == 'signal':
+        # RFC 4254 section 6.9, which paramiko does not implement.
+        m.get_boolean()
+        name: str = m.get_text()
+        proc: subprocess.Popen = channel.__dict__.get('proc')
+        if proc is not None and hasattr(signal, f'SIG{name}'):
+            proc.send_signal(getattr(signal, f'SIG{name}'))
+        return
+    m.packet.seek(position)
+    paramiko.Channel._handle_request(channel, m)
+    # The command is started once its request is answered, a quick command
+    # would close the channel before the reply otherwise, and the client
+    # would see "Channel closed".
+    command: threading.Thread = channel.__dict__.pop('command', None)
+    if command is not None:
+        command.start()
+
+
+class _Transport(paramiko.Transport):
+    _channel_handler_table = {
+        **paramiko.Transport._channel_handler_table,
+        MSG_CHANNEL_REQUEST: _handle_channel_request
+    }
+
+
+class _ServerInterface(paramiko.ServerInterface):
+
+    def __init__(self, server: 'SSHServer'):
+        self.server  = server
+        self.env     = {}
+        self.forward = {}
+
+    def get_allowed_auths(self, username: str) -> str:
+        return 'password'
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(
+            self, chanid: int, origin: tuple, destination: tuple
+    ) -> int:
+        self.forward[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_env_request(self, channel, name, value) -> bool:
+        env: dict = self.env.setdefault(channel.chanid, {})
+        env[name.decode()] = value.decode()
+        return True
+
+    def check_channel_pty_request(self, channel, *a) -> bool:
+        return True
+
+    def check_channel_exec_request(self, channel, command: bytes) -> bool:
+        env: dict = self.env.pop(channel.chanid, None)
+        channel.command = threading.Thread(
+            target=self.server.execute,
+            args  =(channel, command.decode(), env),
+            daemon=True
+        )
+        return True
+
+    def check_channel_shell_request(self, channel) -> bool:
+        return self.check_channel_exec_request(channel, b'exec /bin/sh')
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(
+                os.fstat(self.readfile.fileno())
+            )
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class _SFTPServerInterface(paramiko.SFTPServerInterface):
+
+    @staticmethod
+    def call(func, *a):
+        try:
+            func(*a)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def open(self, path: str, flags: int, attr):
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _SFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def list_folder(self, path: str):
+        try:
+            return [
+                paramiko.SFTPAttributes.from_stat(
+                    os.lstat(os.path.join(path, name)), name
+                ) for name in os.listdir(path)
+            ]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path: str):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path: str):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def canonicalize(self, path: str) -> str:
+        return os.path.abspath(path)
+
+    def remove(self, path: str):
+        return self.call(os.remove, path)
+
+    def rename(self, oldpath: str, newpath: str):
+        return self.call(os.rename, oldpath, newpath)
+
+    def posix_rename(self, oldpath: str, newpath: str):
+        return self.call(os.replace, oldpath, newpath)
+
+    def mkdir(self, path: str, attr):
+        return self.call(os.mkdir, path)
+
+    def rmdir(self, path: str):
+        return self.call(os.rmdir, path)
+
+    def chattr(self, path: str, attr):
+        if attr.st_mode is not None:
+            return self.call(os.chmod, path, attr.st_mode & 0o7777)
+        if attr.st_size is not None:
+            return self.call(os.truncate, path, attr.st_size)
+        return paramiko.SFTP_OK
+
+
+def delay(
+        a: socket.socket, b: socket.socket, seconds: float, rate: float = 0
+):
+    """Relay bytes from `a` to `b` `seconds` late, as a link with a long
+    propagation delay does. With a `rate` (bytes per second) the bytes are
+    also sent no faster than that, the excess waits in an unbounded queue,
+    as in the buffer of a router."""
+    pending = queue.Queue()
+    free: float = 0  # When the link has sent the bytes queued so far.
+
+    def read():
+        nonlocal free
+        while True:
+            try:
+                chunk: bytes = a.recv(65536)
+            except OSError:
+                chunk = b''
+            due: float = time.monotonic()
+            if rate:
+                free = max(free, due) + len(chunk) / rate
+                due = free
+            pending.put((due + seconds, chunk))
+            if not chunk:
+                break
+
+    def write():
+        while True:
+            due, chunk = pending.get()
+            if not chunk:
+                break
+            time.sleep(max(0, due - time.monotonic()))
+            try:
+                b.sendall(chunk)
+            except OSError:
+                break
+        for sock in a, b:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    threading.Thread(target=read, daemon=True).start()
+    threading.Thread(target=write, daemon=True).start()
+
+
+class SSHServer:
+
+    def __init__(
+            self, *, latency: float = 0, rtt: float = 0, mbit: float = 0
+    ):
+        """
+        @param latency: Seconds to sleep before each command is started, it
+                        simulates the round trip time of a remote network.
+        @param rtt:     Round trip time in seconds added to every connection,
+                        each direction is delayed by half of it.
+        @param mbit:    Bandwidth of each direction of every connection in
+                        Mbit/s, default unlimited.
+        """
+        self.latency  = latency
+        self.rtt      = rtt
+        self.mbit     = mbit
+        self.host_key = paramiko.RSAKey.generate(2048)
+
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1024)
+        self.address: tuple = self.sock.getsockname()
+
+        self.transports = []
+        self.running    = True
+
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def __enter__(self) -> 'SSHServer':
+        return self
+
+    def __exit__(self, *a):
+        self.close()
+
+    def close(self):
+        self.running = False
+        self.sock.close()
+        for t in self.transports:
+            t.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.rtt or self.mbit:
+                near, far = socket.socketpair()
+                rate: float = self.mbit * 1e6 / 8
+                delay(conn, near, self.rtt / 2, rate)
+                delay(near, conn, self.rtt / 2, rate)
+                conn = far
+            t = _Transport(conn)
+            t.add_server_key(self.host_key)
+            # Only used if the client asks for it, `compress=True`.
+            t.use_compression(True)
+            t.set_subsystem_handler(
+                'sftp', paramiko.SFTPServer, _SFTPServerInterface
+            )
+            self.transports.append(t)
+            interface = _ServerInterface(self)
+            t.start_server(threading.Event(), interface)
+            threading.Thread(
+                target=self.accept, args=(t, interface), daemon=True
+            ).start()
+
+    def accept(self, t: paramiko.Transport, interface: _ServerInterface):
+        # Every opened channel is queued for `accept`, the session channels
+        # are served by the interface callbacks, the forwarded ones here.
+        # A session channel is kept referenced until it is closed, a
+        # collected `Channel` closes itself, maybe before its exec request.
+        sessions = set()
+        while t.is_active():
+            channel: paramiko.Channel = t.accept(1)
+            if channel is None:
+                continue
+            destination: tuple = interface.forward.pop(channel.chanid, None)
+            if destination is None:
+                sessions = {x for x in sessions if not x.closed}
+                sessions.add(channel)
+            else:
+                threading.Thread(
+                    target=self.forward, args=(channel, destination),
+                    daemon=True
+                ).start()
+
+    @staticmethod
+    def forward(channel: paramiko.Channel, destination: tuple):
+        try:
+            sock = socket.create_connection(destination)
+        except OSError:
+            channel.close()
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def pump(recv, send, shutdown):
+            try:
+                for chunk in iter(lambda: recv(32768), b''):
+                    send(chunk)
+            except OSError:
+                pass
+            try:
+                shutdown()
+            except OSError:
+                pass
+
+        def close():
+            channel.close()
+            sock.close()
+
+        # Only the reading side closes the socket, closed from the other
+        # thread its descriptor may be reused by a new connection while
+        # still being read, and the bytes of that connection would be lost.
+        threading.Thread(
+            target=pump,
+            args  =(channel.recv, sock.sendall,
+                    lambda: sock.shutdown(socket.SHUT_WR)),
+            daemon=True
+        ).start()
+        pump(sock.recv, channel.sendall, close)
+
+    def execute(
+            self, channel: paramiko.Channel, command: str, env: dict = None
+    ):
+        if self.latency:
+            time.sleep(self.latency)
+
+        proc = subprocess.Popen(
+            command,
+            shell =True,
+            stdin =subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env   =env and {**os.environ, **env}
+        )
+        channel.proc = proc
+
+        def pump(src, send):
+            for chunk in iter(lambda: src.read1(32768), b''):
+                send(chunk)
+
+        def feed():
+            try:
+                for chunk in iter(lambda: channel.recv(32768), b''):
+                    proc.stdin.write(chunk)
+                    proc.stdin.flush()
+                proc.stdin.close()
+            except (OSError, EOFError):
+                pass
+
+        threading.Thread(target=feed, daemon=True).start()
+        err = threading.Thread(
+            target=pump, args=(proc.stderr, channel.sendall_stderr), daemon=True
+        )
+        err.start()
+        try:
+            pump(proc.stdout, channel.sendall)
+            err.join()
+            status: int = proc.wait()
+            if status < 0:
+                send_exit_signal(channel, signal.Signals(-status).name[3:])
+            else:
+                channel.send_exit_status(status)
+        except (OSError, EOFError):
+            proc.kill()
+        finally:
+            try:
+                channel.close()
+            except (OSError, EOFError):
+                pass  # The connection is gone.
+
@@ -0,0 +1,97 @@
+"""
+SFTP throughput benchmark against the in-process server.
+
+    python -m benchmark.sftp [MEGABYTES] [RTT_MS]
+
+Every connection to the server is delayed by RTT_MS (default 40) in total, as
+a remote network would. "naive" writes/reads one request at a time, "paramiko"
+is `SFTPClient.put/get` (pipelined, one channel), and "gqylpy wN" is
+`GqylpySSH.put/get` with N workers, each on its own channel.
+"""
+import os
+import sys
+import time
+import tempfile
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+
+def naive_put(ssh: GqylpySSH, local: str, remote: str):
+    with ssh.open_sftp() as sftp, open(local, 'rb') as fl, \
+            sftp.open(remote, 'wb') as fr:
+        for data in iter(lambda: fl.read(32768), b''):
+            fr.write(data)
+
+
+def naive_get(ssh: GqylpySSH, remote: str, local: str):
+    with ssh.open_sftp() as sftp, sftp.open(remote, 'rb') as fr, \
+            open(local, 'wb') as fl:
+        for data in iter(lambda: fr.read(32768), b''):
+            fl.write(data)
+
+
+def paramiko_put(ssh: GqylpySSH, local: str, remote: str):
+    with ssh.open_sftp() as sftp:
+        sftp.put(local, remote)
+
+
+def paramiko_get(ssh: GqylpySSH, remote: str, local: str):
+    with ssh.open_sftp() as sftp:
+        sftp.get(remote, local)
+
+
+def main(megabytes: int, rtt: float):
+    tmp = tempfile.mkdtemp(prefix='gqylpy-sftp-')
+    local, remote, back = (
+        os.path.join(tmp, name) for name in ('local', 'remote', 'back')
+    )
+    with open(local, 'wb') as f:
+        f.write(os.urandom(megabytes << 20))
+
+    cases = {
+        'naive':     (naive_put, naive_get),
+        'paramiko':  (paramiko_put, paramiko_get)
+    }
+    for workers in 1, 4, 8:
+        cases[f'gqylpy w{workers}'] = (
+            lambda ssh, a, b, w=workers: ssh.put(a, b, workers=w),
+            lambda ssh, a, b, w=workers: ssh.get(a, b, workers=w)
+        )
+
+    with SSHServer(rtt=rtt) as server:
+        ssh = GqylpySSH(
+            *server.address,
+            username     ='bench',
+            password     ='bench',
+            allow_agent  =False,
+            look_for_keys=False
+        )
+        print(f'{megabytes} MiB, rtt {rtt * 1e3:.0f} ms')
+        print(f'{"method":<12} {"put(MiB/s)":>11} {"get(MiB/s)":>11}')
+        for name, (put, get) in cases.items():
+            start = time.perf_counter()
+            put(ssh, local, remote)
+            put_time = time.perf_counter() - start
+            start = time.perf_counter()
+            get(ssh, remote, back)
+            get_time = time.perf_counter() - start
+            with open(local, 'rb') as a, open(back, 'rb') as b:
+                assert a.read() == b.read(), name
+            print(
+                f'{name:<12} {megabytes / put_time:>11.1f} '
+                f'{megabytes / get_time:>11.1f}'
+            )
+        ssh.close()
+
+    for path in local, remote, back:
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if sys.argv[1:] else 64,
+        float(sys.argv[2]) / 1e3 if sys.argv[2:] else 0.04
+    )
@@ -0,0 +1,46 @@
+"""
+Throughput of piping local data into a remote command with `cmd(stdin=...)`.
+
+    python -m benchmark.stdin [MEGABYTES]
+
+The data is streamed from a generator, so the local memory stays flat
+whatever the size, and `wc -c` on the remote side checks that every byte
+arrived.
+"""
+import sys
+import time
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+CHUNK = b'\0' * (1 << 20)
+
+
+def main(megabytes: int):
+    with SSHServer() as server:
+        ssh = GqylpySSH(
+            *server.address,
+            username     ='bench',
+            password     ='bench',
+            allow_agent  =False,
+            look_for_keys=False
+        )
+        print(f'{"source":<10} {"MiB":>6} {"seconds":>8} {"MiB/s":>7}')
+        for name, stdin in (
+            ('bytes',     CHUNK * min(megabytes, 256)),
+            ('generator', (CHUNK for _ in range(megabytes)))
+        ):
+            size: int = len(stdin) >> 20 if name == 'bytes' else megabytes
+            start = time.perf_counter()
+            c = ssh.cmd('wc -c', stdin=stdin)
+            elapsed = time.perf_counter() - start
+            assert int(c.output_else_raise()) == size << 20, c.output
+            print(
+                f'{name:<10} {size:>6} {elapsed:>8.2f} {size / elapsed:>7.1f}'
+            )
+        ssh.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 512)
@@ -0,0 +1,198 @@
+"""
+The benchmark suite, results are written as JSON to compare them across
+changes and releases.
+
+    python -m benchmark.suite [-o results.json] [--compare baseline.json]
+                              [--latency S] [--rtt S] [--output-mb N]
+                              [--repeat N] [--commands N] [--concurrency N]
+
+It measures against the in-process server:
+
+    connect     TCP connect, key exchange and authentication
+    cmd         latency of a single `cmd`
+    cmd_many    commands per second of `cmd_many`, sequential and batch
+    cmd_async   wall time of `cmd_async` commands running concurrently
+    output      time and peak Python memory of a large output, in memory
+                and spooled to a temporary file (`max_memory`)
+
+`--latency` delays the start of each remote command, `--rtt` adds a round
+trip time to the connection. Timings are the median (and p90) of the
+repeats. With `--compare`, the ratio of each timing to the baseline is
+printed, above 1 is slower.
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+import paramiko
+import gqylpy_ssh
+
+from gqylpy_ssh import GqylpySSH
+
+from .server import SSHServer
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        'median': statistics.median(samples),
+        'p90'   : samples[int(len(samples) * .9) if len(samples) > 1 else 0],
+        'min'   : samples[0],
+        'n'     : len(samples)
+    }
+
+
+def timed(func, repeat: int) -> dict:
+    func()  # Warm up.
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_connect(server: SSHServer, args) -> dict:
+    def connect():
+        GqylpySSH(*server.address, **PARAMS).close()
+    return {'seconds': timed(connect, max(args.repeat // 10, 5))}
+
+
+def bench_cmd(ssh: GqylpySSH, args) -> dict:
+    return {'seconds': timed(lambda: ssh.cmd('true'), args.repeat)}
+
+
+def bench_cmd_many(ssh: GqylpySSH, args) -> dict:
+    commands = ['echo %d' % i for i in range(args.commands)]
+    result = {}
+    for mode, batch in ('sequential', False), ('batch', True):
+        seconds: dict = timed(
+            lambda: list(ssh.cmd_many(commands, batch=batch)),
+            max(args.repeat // 20, 3)
+        )
+        result[mode] = {
+            'seconds'        : seconds,
+            'commands_per_s' : args.commands / seconds['median']
+        }
+    return result
+
+
+def bench_cmd_async(ssh: GqylpySSH, args) -> dict:
+    def run():
+        futures = [
+            ssh.cmd_async('sleep 0.05') for _ in range(args.concurrency)
+        ]
+        for future in futures:
+            future.result()
+    seconds: dict = timed(run, max(args.repeat // 20, 3))
+    return {
+        'concurrency': args.concurrency,
+        'seconds'    : seconds,
+        # 1 means as fast as one command, `concurrency` as slow as in turn.
+        'serialization': (seconds['median'] - args.latency) / .05
+    }
+
+
+def bench_output(server: SSHServer, args) -> dict:
+    command = f'head -c {args.output_mb << 20} /dev/zero'
+    size: int = args.output_mb << 20
+    result = {}
+    for mode, max_memory in ('memory', None), ('spooled', 1 << 20):
+        ssh = GqylpySSH(*server.address, max_memory=max_memory, **PARAMS)
+        seconds: dict = timed(
+            lambda: ssh.cmd(command), max(args.repeat // 20, 3)
+        )
+        # Separately, tracing slows the allocations down.
+        tracemalloc.start()
+        c = ssh.cmd(command)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(c.stdout) == size, len(c.stdout)
+        del c
+        ssh.close()
+        result[mode] = {
+            'seconds'    : seconds,
+            'mib_per_s'  : args.output_mb / seconds['median'],
+            'peak_memory': peak
+        }
+    return result
+
+
+PARAMS = {
+    'username'     : 'bench',
+    'password'     : 'bench',
+    'allow_agent'  : False,
+    'look_for_keys': False
+}
+
+
+def main(args):
+    results = {}
+    with SSHServer(latency=args.latency, rtt=args.rtt) as server:
+        results['connect'] = bench_connect(server, args)
+        ssh = GqylpySSH(*server.address, **PARAMS)
+        results['cmd'] = bench_cmd(ssh, args)
+        results['cmd_many'] = bench_cmd_many(ssh, args)
+        results['cmd_async'] = bench_cmd_async(ssh, args)
+        ssh.close()
+        results['output'] = bench_output(server, args)
+
+    report = {
+        'version'  : gqylpy_ssh.__doc__.split('@version: ')[1].split()[0],
+        'python'   : platform.python_version(),
+        'paramiko' : paramiko.__version__,
+        'platform' : platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'params'   : {
+            k: v for k, v in vars(args).items() if k not in ('o', 'compare')
+        },
+        'results'  : results
+    }
+    text: str = json.dumps(report, indent=2)
+    if args.o:
+        with open(args.o, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline: dict = json.load(f)
+        print(f'{"timing (median)":<28} {"baseline":>10} {"now":>10} '
+              f'{"ratio":>6}', file=sys.stderr)
+        for name, old, new in compare(baseline['results'], results):
+            print(f'{name:<28} {old:>10.4f} {new:>10.4f} {new / old:>6.2f}',
+                  file=sys.stderr)
+
+
+def compare(old: dict, new: dict, prefix: str = ''):
+    for key, value in new.items():
+        if key not in old:
+            continue
+        if key == 'seconds':
+            yield prefix.rstrip('.'), old[key]['median'], value['median']
+        elif isinstance(value, dict):
+            yield from compare(old[key], value, f'{prefix}{key}.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmark.suite')
+    parser.add_argument('-o', metavar='FILE', help='write the JSON here')
+    parser.add_argument('--compare', metavar='FILE', help='baseline JSON')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds before each remote command starts')
+    parser.add_argument('--rtt', type=float, default=0,
+                        help='round trip time added to the connections')
+    parser.add_argument('--output-mb', type=int, default=64,
+                        help='size of the large output in MiB')
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='samples of the single-command latency')
+    parser.add_argument('--commands', type=int, default=100,
+                        help='commands of each cmd_many')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='concurrent cmd_async commands')
+    main(parser.parse_args())
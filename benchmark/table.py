@@ -0,0 +1,61 @@
+"""
+Benchmark of parsing a `ps aux` like output into rows.
+
+    python -m benchmark.table [ROWS]
+
+"table2dict" builds one dictionary per row, "table" yields tuples, and the
+"convert" variant also converts the numeric cells. "fixed-width" parses a
+`docker ps` like output whose titles and cells contain spaces.
+"""
+import sys
+import time
+
+from gqylpy_ssh import Command
+
+PS = (
+    b'USER         PID %CPU %MEM    VSZ   RSS TTY      STAT START   TIME '
+    b'COMMAND\n',
+    b'root     %7d  0.0  0.1 169084 13204 ?        Ss   10:00   0:01 '
+    b'/sbin/init splash\n'
+)
+DOCKER = (
+    b'CONTAINER ID   IMAGE     CREATED       STATUS       NAMES\n',
+    b'3f4e5a6b7c8d   nginx     2 hours ago   Up 2 hours   web-%07d\n'
+)
+
+
+def run(func) -> float:
+    start = time.perf_counter()
+    for _ in func():
+        pass
+    return time.perf_counter() - start
+
+
+def main(rows: int):
+    ps = Command('ps aux', PS[0] + b''.join(
+        PS[1] % i for i in range(rows)
+    ), b'', exit_status=0)
+    docker = Command('docker ps', DOCKER[0] + b''.join(
+        DOCKER[1] % i for i in range(rows)
+    ), b'', exit_status=0)
+    ps.output, docker.output  # decode once, outside of the measurement
+
+    cases = {
+        'table2dict':       lambda: ps.table2dict(),
+        'table':            lambda: ps.table(),
+        'table(convert)':   lambda: ps.table(convert=True),
+        'to_columns':       lambda: [ps.table().to_columns()],
+        'fixed-width':      lambda: docker.table()
+    }
+
+    print(f'{rows} rows')
+    print(f'{"parser":<18} {"total(ms)":>10} {"per row(us)":>12}')
+    for name, func in cases.items():
+        elapsed: float = run(func)
+        print(
+            f'{name:<18} {elapsed * 1e3:>10.1f} {elapsed / rows * 1e6:>12.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 100000)
@@ -10,7 +10,7 @@ expected.
     >>> c.status_output
     (True, 'Hi, GQYLPY')
 
-    @version: 1.2.6
+    @version: 1.2.7
     @author: 竹永康 <gqylpy@outlook.com>
     @source: https://github.com/gqylpy/gqylpy-ssh
 
@@ -31,10 +31,14 @@ PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
 You should have received a copy of the GNU Lesser General Public License along
 with gqylpy-ssh. If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+import mmap
 import paramiko
-import threading
 
-from typing import Union, Tuple, Generator, Any
+from concurrent.futures import Future, Executor
+
+from typing import Union, Tuple, Iterator, Generator, AsyncGenerator
+from typing import Callable, BinaryIO, Any
 
 __first__: 'GqylpySSH'
 
@@ -65,6 +69,20 @@ def __init__(
         sock                  = None,
         auto_sudo:       bool = False,
         reconnect:       bool = False,
+        sentinel:        bool = False,
+        max_sessions:    int  = 10,
+        pool                  = None,
+        cache                 = None,
+        max_memory:      int  = None,
+        encoding:        str  = 'utf-8',
+        encoding_errors: str  = 'strict',
+        lazy:            bool = False,
+        keepalive:       float = None,
+        supervisor            = None,
+        jump                  = None,
+        metrics               = None,
+        executor              = None,
+        profile               = None,
 
         gname:           str  = None
 ) -> 'GqylpySSH':
@@ -76,7 +94,10 @@ def __init__(
     @param password:     Used for password authentication; is also used for
                          private key decryption if the parameter `passphrase` is
                          not given.
-    @param key_filename: Default file ~/.ssh/{id_rsa,id_dsa,id_ecdsa}.
+    @param key_filename: Default file ~/.ssh/{id_rsa,id_dsa,id_ecdsa}. RSA,
+                         ECDSA, Ed25519 and DSA keys are detected, and the
+                         decrypted key is cached for the process by path,
+                         mtime and password.
     @param key_password: If the key has a password.
     @param timeout:      TCP Connect timeout period (in seconds), default
                          permanent.
@@ -108,6 +129,44 @@ def __init__(
     @param reconnect:           If the ssh connection is disconnected when you
                                 call method `self.cmd`, will attempt to
                                 reconnect.
+    @param sentinel:            Determine the command status by appending
+                                "&& echo 4289077" to the command, as versions
+                                before 1.2.7 did, instead of the exit status.
+    @param max_sessions:        Maximum number of channels `self.cmd_mux` opens
+                                at the same time, sshd option "MaxSessions"
+                                defaults to 10.
+    @param pool:                Check out the connection from a pool instead of
+                                connecting, True means `ConnectionPool.default`
+                                or give a `ConnectionPool` instance.
+    @param cache:               Where `self.cmd(..., ttl=...)` caches results,
+                                default `ResultCache.default`, False disables
+                                the cache.
+    @param max_memory:          Output of `self.cmd` beyond this many bytes (for
+                                each of stdout and stderr) is spooled into a
+                                temporary file and memory-mapped, default
+                                unlimited.
+    @param encoding:            Encoding used to decode the command output.
+    @param encoding_errors:     Error handling scheme used to decode the command
+                                output, such as "strict", "replace" or
+                                "surrogateescape".
+    @param lazy:                Do not connect now, connect on the first use
+                                (`cmd`, `put`, ...) or by `connect_all()`.
+    @param keepalive:           Supervise the connection in the background:
+                                send a keepalive every this many seconds, and
+                                reconnect with backoff if it is not answered.
+    @param supervisor:          The `Supervisor` used when `keepalive` is set,
+                                default `Supervisor.default`.
+    @param jump:                Reach the host through a jump host (bastion),
+                                a GqylpySSH instance, a "[user@]host[:port]"
+                                string or a list of them for several hops.
+    @param metrics:             Record the timing spans of the commands, True
+                                means `Metrics.default` or give a `Metrics`
+                                instance, default disabled.
+    @param executor:            Where `cmd_async` runs the commands, default
+                                `CommandExecutor.default`.
+    @param profile:             Tune the connection for "throughput" or
+                                "low-latency", or give a `Profile` instance,
+                                default the paramiko settings.
 
     @param gname: Create a pointer to an instance of `GqylpySSH` in the
                   `gqylpy_ssh` module, if not None.
@@ -137,7 +196,21 @@ def __init__(
         passphrase         =passphrase,
         disabled_algorithms=disabled_algorithms,
         auto_sudo          =auto_sudo,
-        reconnect          =reconnect
+        reconnect          =reconnect,
+        sentinel           =sentinel,
+        max_sessions       =max_sessions,
+        pool               =pool,
+        cache              =cache,
+        max_memory         =max_memory,
+        encoding           =encoding,
+        encoding_errors    =encoding_errors,
+        lazy               =lazy,
+        keepalive          =keepalive,
+        supervisor         =supervisor,
+        jump               =jump,
+        metrics            =metrics,
+        executor           =executor,
+        profile            =profile
     )
 
     if gname is None:
@@ -148,6 +221,454 @@ def __init__(
     gpack[gname] = gobj
 
 
+def connect_all(*, concurrency: int = 16) -> dict:
+    """Connect the instances registered by `__init__(..., gname=...)` that
+    are not connected yet, typically created with `lazy=True`, in parallel.
+    A host that cannot be reached does not stop the others.
+
+        >>> for host in hosts:
+        ...     gqylpy_ssh.__init__(host, gname=host, lazy=True, ...)
+        >>> errors = gqylpy_ssh.connect_all(concurrency=64)
+
+    @param concurrency: Maximum number of handshakes at the same time.
+
+    @return: {gname: exception} of the instances that failed to connect.
+    """
+    return {}
+
+
+class ConnectionPool:
+    """A pool of authenticated connections keyed by host, port, username and
+    credentials. `GqylpySSH(..., pool=True)` checks out a connection from
+    `ConnectionPool.default` instead of doing TCP connect, key exchange and
+    authentication, and `GqylpySSH.close` returns it to the pool.
+
+        >>> for _ in range(1000):
+        ...     with GqylpySSH('192.168.1.7', username=..., pool=True) as ssh:
+        ...         ssh.cmd('uptime')
+        >>> ConnectionPool.default.stats
+        {'hits': 999, 'misses': 1, 'evictions': 0, 'idle': 1, 'active': 0}
+    """
+    default: 'ConnectionPool'
+    # The process-wide pool used by `pool=True`.
+
+    def __init__(
+            self,
+            *,
+            max_per_host:     int   = 4,
+            idle_timeout:     float = 300,
+            ping_after:       float = 30,
+            ping_timeout:     float = 5,
+            checkout_timeout: float = None
+    ):
+        """
+        @param max_per_host:     Maximum number of connections for each key,
+                                 checked out or idle.
+        @param idle_timeout:     Idle connections older than this (in seconds)
+                                 are closed.
+        @param ping_after:       Connections idle longer than this (in seconds)
+                                 are checked with a keepalive round trip before
+                                 checkout, half-open connections are dropped.
+        @param ping_timeout:     Timeout of the keepalive round trip.
+        @param checkout_timeout: Time to wait for a connection when the limit
+                                 of a key is reached, default permanent.
+        """
+        self.hits:      int = 0
+        self.misses:    int = 0
+        self.evictions: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Counters hits/misses/evictions and current idle/active counts."""
+
+    def checkout(self, key: tuple, connect: Callable) -> paramiko.Transport:
+        """Get a live connection of key, call `connect()` to create one if
+        there is no idle connection and the limit is not reached."""
+
+    def checkin(self, key: tuple, transport: paramiko.Transport) -> None:
+        """Return a connection to the pool."""
+
+    def discard(self, key: tuple, transport: paramiko.Transport) -> None:
+        """Close a checked out connection instead of returning it."""
+
+    def evict(self) -> None:
+        """Close the connections idle longer than `self.idle_timeout`."""
+
+    def clear(self) -> None:
+        """Close all idle connections."""
+
+
+class Supervisor:
+    """Keeps the connections of `GqylpySSH(..., keepalive=...)` alive. One
+    thread schedules the checks, a small thread pool runs them: a keepalive
+    round trip (a "keepalive@openssh.com" global request, which unlike TCP
+    keepalive detects a hung peer), and a reconnect if it is not answered.
+
+        >>> ssh = GqylpySSH('192.168.1.7', username=..., keepalive=15)
+        >>> ssh.state
+        'connected'
+        >>> Supervisor.default.stats
+        {'supervised': 1, 'connected': 1, 'reconnecting': 0, 'reconnects': 0,
+         'downtime': 0, 'pings': 4, 'ping_failures': 0}
+    """
+    default: 'Supervisor'
+    # The process-wide supervisor used by `keepalive=...`.
+
+    def __init__(
+            self,
+            *,
+            ping_timeout: float = 5,
+            backoff:      float = 1,
+            max_backoff:  float = 60,
+            workers:      int   = 8
+    ):
+        """
+        @param ping_timeout: Time for the keepalive to be answered.
+        @param backoff:      Delay before the second reconnect attempt, it
+                             doubles after each failure, the actual delay is
+                             picked between half of it and all of it.
+        @param max_backoff:  Upper bound of the delay between attempts.
+        @param workers:      Number of checks or reconnects run at the same
+                             time.
+        """
+        self.pings:         int = 0
+        self.ping_failures: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Number of supervised, connected and reconnecting instances, their
+        reconnects and downtime in total, and the keepalive counters."""
+
+    def register(self, gobj: 'GqylpySSH') -> None:
+        """Supervise an instance until it is closed or its `keepalive` is
+        set to None, done by `GqylpySSH` itself."""
+
+    def pinged(self, ok: bool) -> None:
+        """Count a keepalive round trip, answered or not, done by
+        `GqylpySSH` itself."""
+
+
+class ResultCache:
+    """A TTL/LRU cache of command results, used by `GqylpySSH.cmd(..., ttl=)`.
+    Results are keyed by host, port, username, command (after "sudo" is
+    added), environment variables and pseudo-terminal, only successful
+    results are cached.
+
+        >>> ssh.cmd('uname -r', ttl=3600)  # Executed.
+        >>> ssh.cmd('uname -r', ttl=3600)  # No network round trip.
+        >>> ResultCache.default.stats
+        {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 33}
+    """
+    default: 'ResultCache'
+    # The process-wide cache used by `GqylpySSH` instances by default.
+
+    def __init__(self, *, max_bytes: int = 64 << 20):
+        """
+        @param max_bytes: Memory bound of the cached outputs, the least
+                          recently used results are evicted beyond it.
+        """
+        self.hits:      int = 0
+        self.misses:    int = 0
+        self.evictions: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Counters hits/misses/evictions and current entries/bytes."""
+
+    def get(self, key: tuple) -> 'Command':
+        """Get a fresh result or None."""
+
+    def put(self, key: tuple, command: 'Command', ttl: float) -> None:
+        """Cache a result for `ttl` seconds."""
+
+    def invalidate(self, hostname: str = None, command: str = None) -> None:
+        """Remove the results of a host and/or command, all if both None."""
+
+    def clear(self) -> None:
+        """Remove all results."""
+
+
+class Metrics:
+    """Per-host histograms and counters of the commands run by the instances
+    created with `GqylpySSH(..., metrics=True)` (or a `Metrics` instance),
+    each command is timed by a `Span`. Disabled instances only pay one
+    attribute check per command.
+
+        >>> ssh = GqylpySSH('192.168.1.7', username=..., metrics=True)
+        >>> ssh.cmd('uptime')
+        >>> Metrics.default.stats['192.168.1.7:22']['total']
+        {'count': 1, 'sum': 0.0021}
+        >>> print(Metrics.default.to_prometheus())
+        # TYPE gqylpy_ssh_command_seconds histogram
+        gqylpy_ssh_command_seconds_bucket{host="192.168.1.7",port="22",...
+
+    Hooks are called with each finished `Span`, so that your own tracer can
+    record it, e.g. as an OpenTelemetry span from `span.start` to
+    `span.start + span.total`:
+
+        >>> Metrics.default.hooks.append(lambda span: print(span))
+    """
+    default: 'Metrics'
+    # The process-wide metrics used by `metrics=True`.
+
+    def __init__(
+            self,
+            *,
+            buckets: Union[tuple, list] = (
+                .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60
+            ),
+            hooks:   Union[tuple, list] = ()
+    ):
+        """
+        @param buckets: Upper bounds (in seconds) of the histogram buckets.
+        @param hooks:   Callables called with each finished `Span`, in the
+                        thread that ran the command, their exceptions are
+                        turned into warnings.
+        """
+        self.buckets: tuple = buckets
+        self.hooks:   list  = hooks
+
+    @property
+    def stats(self) -> dict:
+        """{"host:port": {counters, {phase: {"count": n, "sum": seconds}}}}.
+        The counters are commands, failures (non-zero exit status), errors
+        (exceptions), bytes_in, bytes_out and reconnects. The phases are
+        connect, channel_open, first_byte and total."""
+
+    def span(
+            self, gobj: 'GqylpySSH', command: str, *, kind: str = 'cmd'
+    ) -> 'Span':
+        """Start a span, it is observed when its `with` block exits."""
+
+    def observe(self, span: 'Span') -> None:
+        """Aggregate a finished span and call the hooks."""
+
+    def reconnected(self, hostname: str, port: int) -> None:
+        """Count a reconnect made outside of a command (by a `Supervisor`)."""
+
+    def to_prometheus(self, *, prefix: str = 'gqylpy_ssh') -> str:
+        """Export the histograms and counters in the Prometheus text format,
+        labelled by host and port, the histograms also by phase."""
+
+    def clear(self) -> None:
+        """Reset all histograms and counters."""
+
+
+class Span:
+    """The timing of one command (or one `cmd_many(..., batch=True)`
+    script), given to the hooks of `Metrics`."""
+
+    def __init__(
+            self,
+            metrics:  Metrics,
+            hostname: str,
+            port:     int,
+            command:  str,
+            kind:     str
+    ):
+        self.metrics:  Metrics = metrics
+        self.hostname: str     = hostname
+        self.port:     int     = port
+        self.command:  str     = command
+
+        self.kind: str = kind
+        # "cmd" (also for `cmd_async` and `cmd_many`) or "cmd_many" (batch).
+
+        self.start: float = ...
+        # `time.time()` when the command was started.
+
+        self.connect: float = None
+        # Seconds spent connecting (lazy) or reconnecting, None if connected.
+
+        self.channel_open: float = None
+        # Seconds to open the channel and request the command.
+
+        self.first_byte: float = None
+        # Seconds from the start to the first output byte, None if none.
+
+        self.total: float = None
+        # Seconds from the start to the completion.
+
+        self.bytes_in:  int = 0
+        self.bytes_out: int = ...
+        # Output bytes received, and the command and stdin bytes sent.
+
+        self.reconnects: int = 0
+        self.exit_status: int = None
+
+        self.error: Exception = None
+        # The exception raised by the command (e.g. a timeout), if any.
+
+    def mark(self, phase: str) -> None:
+        """Add the time since the previous mark (or the start) to `phase`."""
+
+    def received(self, chunks: Iterator) -> Generator:
+        """Pass through the (fd, chunk) of the output, counting them."""
+
+
+class CommandExecutor(Executor):
+    """The executor of `GqylpySSH.cmd_async` (and of commands ending with
+    "&"), a bounded number of worker threads share a bounded queue, instead
+    of one thread per command.
+
+        >>> futures = [ssh.cmd_async(f'ping -c1 10.0.0.{i}') for i in range(9)]
+        >>> for future in as_completed(futures):
+        ...     print(future.result().status)
+        >>> CommandExecutor.default.stats
+        {'workers': 9, 'pending': 0, 'submitted': 9, 'completed': 9,
+         'rejected': 0}
+
+    When `max_pending` commands are queued, `submit` waits for a place, so a
+    producer cannot outrun the hosts by more than that, or raises
+    `SSHException` after `submit_timeout`. The workers are daemon threads, a
+    command still running does not hold the interpreter at exit.
+    """
+    default: 'CommandExecutor'
+    # The process-wide executor used by `GqylpySSH` instances by default.
+
+    def __init__(
+            self,
+            *,
+            max_workers:    int   = 32,
+            max_pending:    int   = 1024,
+            submit_timeout: float = None
+    ):
+        """
+        @param max_workers:    Maximum number of commands running at the same
+                               time, worker threads are started on demand.
+        @param max_pending:    Maximum number of commands queued.
+        @param submit_timeout: Time `submit` waits for a place in a full
+                               queue, 0 fails at once, default permanent.
+        """
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.rejected:  int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Number of worker threads and queued commands, and the counters
+        submitted/completed/rejected."""
+
+    def submit(self, fn: Callable, *a, **kw) -> Future:
+        """Queue `fn(*a, **kw)`, waiting while the queue is full."""
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """Stop the workers once the queued commands are run (or cancelled
+        if `cancel_futures`), waiting for them if `wait`."""
+
+
+class Deadline:
+    """An overall time limit for the commands of one call, or of several
+    calls sharing it, given as `deadline=` to `GqylpySSH.cmd`, `cmd_many`,
+    `cmd_mux`, `cmd_async` and `HostGroup`. Unlike `timeout`, which limits
+    each read, the channel open and every read wait no longer than what is
+    left, then `socket.timeout` is raised. A number of seconds can be given
+    instead of an instance.
+
+        >>> for c in ssh.cmd_many(['make', 'make test'], deadline=600):
+        ...     print(c.output)  # The commands finished in time.
+
+    It can also be cancelled from another thread, the channels in flight are
+    closed at once and `concurrent.futures.CancelledError` is raised:
+
+        >>> deadline = Deadline(300, signal='TERM')
+        >>> future = ssh.cmd_async('./backup.sh', deadline=deadline)
+        >>> deadline.cancel()
+
+    On a timeout or a cancellation the remote process is sent `signal` if
+    given, otherwise it only sees its channel closed (SIGHUP with a pty,
+    EPIPE on output otherwise).
+    """
+
+    def __init__(self, seconds: float = None, *, signal: str = None):
+        """
+        @param seconds: Time allowed from now, default unlimited (can only be
+                        cancelled).
+        @param signal:  Signal sent to the remote processes on a timeout or
+                        a cancellation, such as "TERM" or "KILL", by a
+                        "signal" channel request (RFC 4254 section 6.9),
+                        which OpenSSH honours since version 7.9.
+        """
+        self.seconds:   float = seconds
+        self.signal:    str   = signal
+        self.cancelled: bool  = False
+
+        self.expires: float
+        # `time.monotonic()` of the deadline, None if unlimited.
+
+    @property
+    def expired(self) -> bool:
+        """True once the time is up or `cancel` was called."""
+
+    def remaining(self, timeout: float = None) -> float:
+        """Seconds left, no more than `timeout`, None if both unlimited."""
+
+    def check(self) -> None:
+        """Raise `socket.timeout` if the time is up, or `CancelledError` if
+        cancelled."""
+
+    def cancel(self) -> None:
+        """Cancel the commands in flight and those to come."""
+
+    def abort(self, channel: paramiko.Channel) -> None:
+        """Send `signal` to the remote process if given, and close the
+        channel."""
+
+
+class Profile:
+    """Connection settings tuned for a kind of traffic, given as `profile=`
+    to `GqylpySSH`, by name or as an instance:
+
+        >>> ssh = GqylpySSH('db1', username='backup', profile='throughput')
+        >>> ssh.get('/var/backups/dump.sql', 'dump.sql')
+
+    "throughput" is for bulk output and transfers: AES-GCM first (no
+    separate MAC, the fastest cipher of paramiko), a 16 MiB window, so a
+    link with a high bandwidth-delay product stays busy, 128 KiB packets
+    and 1 MiB reads, fewer of them for the same bytes.
+
+    "low-latency" is for many small commands sharing a connection, maybe
+    with a bulk one: a 512 KiB window and 16 KiB packets, so less data of
+    the bulk channels is queued on the link ahead of the small replies.
+
+    Both prefer curve25519 for the key exchange. The preferred algorithms
+    are put first, the other ones supported by paramiko stay behind them,
+    so a server supporting none of them is still connected. Add one to
+    `Profile.profiles` to use it by name.
+    """
+    profiles: dict
+    # Name -> `Profile`, "throughput" and "low-latency".
+
+    def __init__(
+            self,
+            name:            str,
+            *,
+            ciphers:         tuple = (),
+            macs:            tuple = (),
+            kex:             tuple = (),
+            window_size:     int   = 2097152,
+            max_packet_size: int   = 32768,
+            read_size:       int   = 32768
+    ):
+        """
+        @param name:            The name of the profile.
+        @param ciphers:         Preferred ciphers, in order.
+        @param macs:            Preferred MACs, in order.
+        @param kex:             Preferred key exchange algorithms, in order.
+        @param window_size:     Window of the channels, the bytes the server
+                                can send before waiting for an ack.
+        @param max_packet_size: Largest packet the server may send.
+        @param read_size:       Most bytes read from a channel at once.
+        """
+        self.name            = name
+        self.ciphers         = ciphers
+        self.macs            = macs
+        self.kex             = kex
+        self.window_size     = window_size
+        self.max_packet_size = max_packet_size
+        self.read_size       = read_size
+
+
 class GqylpySSH(paramiko.SSHClient):
 
     def __init__(
@@ -175,7 +696,21 @@ class GqylpySSH(paramiko.SSHClient):
         disabled_algorithms   = None,
         sock                  = None,
         auto_sudo:       bool = False,
-        reconnect:       bool = False
+        reconnect:       bool = False,
+        sentinel:        bool = False,
+        max_sessions:    int  = 10,
+        pool                  = None,
+        cache                 = None,
+        max_memory:      int  = None,
+        encoding:        str  = 'utf-8',
+        encoding_errors: str  = 'strict',
+        lazy:            bool = False,
+        keepalive:       float = None,
+        supervisor            = None,
+        jump                  = None,
+        metrics               = None,
+        executor              = None,
+        profile               = None
     ):
         """
         @param hostname:     Remote host address.
@@ -185,6 +720,10 @@ class GqylpySSH(paramiko.SSHClient):
                              private key decryption if the parameter
                              `passphrase` is not given.
         @param key_filename: Default file ~/.ssh/{id_rsa,id_dsa,id_ecdsa}.
+                             RSA, ECDSA, Ed25519 and DSA keys are detected,
+                             and the decrypted key is cached for the process
+                             by path, mtime and password, a key shared by
+                             many instances is decrypted only once.
         @param key_password: If the key has a password.
         @param timeout:      TCP Connect timeout period (in seconds), default
                              permanent.
@@ -216,6 +755,73 @@ class GqylpySSH(paramiko.SSHClient):
         @param reconnect:           If the ssh connection is disconnected when
                                     you call method `self.cmd`, will attempt to
                                     reconnect.
+        @param sentinel:            Determine the command status by appending
+                                    "&& echo 4289077" to the command, as
+                                    versions before 1.2.7 did, instead of the
+                                    exit status.
+        @param max_sessions:        Maximum number of channels `self.cmd_mux`
+                                    opens at the same time, sshd option
+                                    "MaxSessions" defaults to 10.
+        @param pool:                Check out the connection from a pool
+                                    instead of connecting, True means
+                                    `ConnectionPool.default` or give a
+                                    `ConnectionPool` instance.
+        @param cache:               Where `self.cmd(..., ttl=...)` caches
+                                    results, default `ResultCache.default`,
+                                    False disables the cache.
+        @param max_memory:          Output of `self.cmd` beyond this many bytes
+                                    (for each of stdout and stderr) is spooled
+                                    into a temporary file and memory-mapped,
+                                    default unlimited.
+        @param encoding:            Encoding used to decode the command output.
+        @param encoding_errors:     Error handling scheme used to decode the
+                                    command output, such as "strict", "replace"
+                                    or "surrogateescape".
+        @param lazy:                Do not connect now, the connection is
+                                    opened by the first method that needs it
+                                    (`cmd`, `put`, `get_transport`...), once
+                                    even if called from several threads.
+        @param keepalive:           Supervise the connection in the
+                                    background: every this many seconds a
+                                    keepalive request must be answered within
+                                    `supervisor.ping_timeout`, otherwise the
+                                    connection (possibly half-open) is closed
+                                    and reopened with exponential backoff and
+                                    jitter. Meanwhile `self.cmd` fails fast.
+        @param supervisor:          The `Supervisor` used when `keepalive` is
+                                    set, default `Supervisor.default`.
+        @param jump:                Reach the host through a jump host
+                                    (bastion) like "ssh -J": a "direct-tcpip"
+                                    channel of the jump host's connection is
+                                    used as the socket. Give a GqylpySSH
+                                    instance to share, a "[user@]host[:port]"
+                                    string, or a list of them for several
+                                    hops in order. A string hop is
+                                    authenticated like this host, except the
+                                    username, and is shared process-wide, by
+                                    host, port, username and the hop before,
+                                    so N targets behind one bastion cost one
+                                    bastion handshake. The jump host is
+                                    reconnected if it dropped when this host
+                                    (re)connects.
+        @param metrics:             Record a `Span` for each command run by
+                                    `self.cmd`, `self.cmd_many` and
+                                    `self.cmd_async` (connect, channel open,
+                                    first byte and total time, bytes, and
+                                    reconnects) into per-host histograms.
+                                    True means `Metrics.default` or give a
+                                    `Metrics` instance, default disabled.
+        @param executor:            The `concurrent.futures.Executor` where
+                                    `self.cmd_async` runs the commands,
+                                    default `CommandExecutor.default`, shared
+                                    by all the instances.
+        @param profile:             The preferred algorithms, window, packet
+                                    and read sizes of the connection: the
+                                    name of one in `Profile.profiles`
+                                    ("throughput" or "low-latency") or a
+                                    `Profile` instance. Default None keeps
+                                    the paramiko settings. Cannot be used
+                                    with `transport_factory`.
         """
         super().__init__()
 
@@ -224,7 +830,7 @@ class GqylpySSH(paramiko.SSHClient):
             port               =port,
             username           =username,
             password           =password,
-            pkey               =paramiko.RSAKey.from_private_key_file(
+            pkey               =paramiko.PKey.from_path(
                                     key_filename, key_password
                                 ) if key_filename is not None else None,
             timeout            =timeout,
@@ -243,9 +849,40 @@ class GqylpySSH(paramiko.SSHClient):
             disabled_algorithms=disabled_algorithms
         )
         self.hostname        = hostname
+        self.port            = port
         self.command_timeout = command_timeout
         self.auto_sudo       = auto_sudo
         self.reconnect       = reconnect
+        self.sentinel        = sentinel
+        self.max_sessions    = max_sessions
+        self.pool            = pool
+        self.cache           = cache
+        self.max_memory      = max_memory
+        self.encoding        = encoding
+        self.encoding_errors = encoding_errors
+        self.lazy            = lazy
+        self.keepalive       = keepalive
+        self.supervisor      = supervisor
+        self.jump: GqylpySSH = jump
+        # The last hop, a GqylpySSH instance, or None.
+
+        self.metrics: Metrics = metrics
+        self.executor: Executor = executor
+        self.profile: Profile = profile
+        # The `Profile` instance, or None.
+
+        self.reconnects: int = 0
+        # Number of reconnects made by the supervisor.
+
+        self.downtime: float = 0
+        # Seconds between the detections of a dead connection and the
+        # successful reconnects, in total.
+
+        self.down_since: float = None
+        # `time.monotonic()` when the connection was found dead, None if up.
+
+        self.last_error: Exception = None
+        # The error of the last failed reconnect.
 
         self.params: dict
         # almost all the initialization parameters.
@@ -253,22 +890,55 @@ class GqylpySSH(paramiko.SSHClient):
     def __del__(self):
         self.close()
 
+    @property
+    def state(self) -> str:
+        """"connected", "reconnecting" (found dead by the supervisor) or
+        "disconnected" (not connected yet, or closed)."""
+
     def cmd(
             self,
             command: str,
             *,
-            timeout: int  = None,
-            bufsize: int  = None,
-            get_pty: bool = None,
-            env:     dict = None
+            timeout: int   = None,
+            bufsize: int   = None,
+            get_pty: bool  = None,
+            env:     dict  = None,
+            ttl:     float = None,
+            stdin:   Union[bytes, str, BinaryIO, Iterator] = None,
+            compress: Union[bool, str] = None,
+            deadline: Union[float, Deadline] = None
     ) -> 'Command':
         """
-        @param command: A command string.
+        @param command: A command string, if it ends with "&" it is run by
+                        `self.cmd_async` and its `Future` is returned.
         @param timeout: Execute command timeout, default permanent.
         @param bufsize: Buffer size, default permanent.
         @param get_pty: Whether to enable pseudo-terminal, default False.
         @param env:     A dictionary of environment variables. Indication:
                         server may reject environment variables.
+        @param ttl:     Cache the result in `self.cache` for this many seconds
+                        if the command succeeds, and return the cached result
+                        while it is fresh. Only for idempotent read-only
+                        commands such as "uname -r", default not cached.
+        @param stdin:   Data piped to the remote process, bytes, a file opened
+                        for reading, or an iterator of bytes/str chunks. It is
+                        sent by a thread as fast as the remote process reads
+                        it, so a multi-GB dump is never held in memory, and
+                        EOF is sent at the end. If reading `stdin` raises, the
+                        channel is closed and the exception is re-raised. Not
+                        cached with `ttl`.
+        @param compress: Pipe the output through "zstd" or "gzip" on the
+                         remote host and decompress it locally as it
+                         arrives, True picks zstd (needs the "zstandard"
+                         module locally) then gzip. For large text output
+                         over thin links, unlike the `compress` of the
+                         connection it spares the small commands. Falls back
+                         to the plain output if neither is installed, or
+                         with `get_pty`. stderr is not compressed.
+        @param deadline: Time limit (in seconds, or a `Deadline` shared with
+                         other calls) of the whole command, not of each read
+                         as `timeout`. Once reached the channel is closed and
+                         `socket.timeout` is raised, default unlimited.
         """
         if self.auto_sudo and not (
                 self.params['username'] == 'root' or command.startswith('sudo ')
@@ -308,24 +978,78 @@ class GqylpySSH(paramiko.SSHClient):
                 )
         return Command(command, stdout, stderr)
 
+    def stream(
+            self,
+            command: str,
+            *,
+            timeout: int  = None,
+            bufsize: int  = None,
+            get_pty: bool = None,
+            env:     dict = None,
+            compress: Union[bool, str] = None
+    ) -> 'CommandStream':
+        """Execute a command and get the output as it arrives, rather than
+        buffering all of it in memory.
+
+            >>> with ssh.stream('journalctl -b') as s:
+            ...     for line in s:
+            ...         ...
+            >>> s.status
+            True
+
+        @param command: A command string.
+        @param timeout: Timeout waiting for the next output, default permanent.
+        @param bufsize: Buffer size, default permanent.
+        @param get_pty: Whether to enable pseudo-terminal, default False.
+        @param env:     A dictionary of environment variables. Indication:
+                        server may reject environment variables.
+        @param compress: Compress the output on the remote host, see
+                         `self.cmd`, it is decompressed as it is read.
+        """
+
+    def shell(self, *, timeout: int = None, env: dict = None) -> 'ShellSession':
+        """Open a persistent shell session, see `ShellSession`.
+
+        @param timeout: Default timeout of `ShellSession.cmd`, default
+                        `self.command_timeout`.
+        @param env:     A dictionary of environment variables. Indication:
+                        server may reject environment variables.
+        """
+
     def cmd_many(
             self,
             commands: Union[list, tuple],
             *,
+            batch:   bool = False,
             timeout: int  = None,
             bufsize: int  = None,
             get_pty: bool = None,
-            env:     dict = None
+            env:     dict = None,
+            compress: Union[bool, str] = None,
+            deadline: Union[float, Deadline] = None
     ) -> Generator:
         """
         @param commands: A commands tuple or list.
+        @param batch:    Send all commands as one remote script in a single
+                         channel and split the output back into a `Command`
+                         for each, instead of a round trip for each command.
+                         Each command still runs in its own subshell, and
+                         cannot use pseudo-terminal, `ttl` or `stdin`.
         @param timeout:  Execute command timeout, default permanent.
         @param bufsize:  Buffer size, default permanent.
         @param get_pty:  Whether to enable pseudo-terminal, default False.
         @param env:      A dictionary of environment variables. Indication:
                          server may reject environment variables.
+        @param compress: Compress the output on the remote host, see
+                         `self.cmd`, in batch mode the whole script's.
+        @param deadline: Time limit (in seconds, or a `Deadline`) of all the
+                         commands together. The results of the commands
+                         finished in time are yielded, then `socket.timeout`
+                         is raised and the channel in flight is closed.
         """
-        if isinstance(commands, list):
+        if batch:
+            yield from one_script_for_all_commands(commands)
+        elif isinstance(commands, list):
             yield from (self.cmd(
                 command=c,
                 timeout=timeout,
@@ -347,7 +1071,202 @@ class GqylpySSH(paramiko.SSHClient):
         else:
             raise TypeError
 
+    def cmd_mux(
+            self,
+            commands:     Union[list, tuple],
+            *,
+            max_sessions: int  = None,
+            timeout:      int  = None,
+            bufsize:      int  = None,
+            get_pty:      bool = None,
+            env:          dict = None,
+            deadline:     Union[float, Deadline] = None
+    ) -> Generator:
+        """Execute commands concurrently, each on its own session channel of
+        the one existing connection, no extra TCP connection or key exchange
+        is made. The commands are serviced by the calling thread, and the
+        results are yielded in the order they finish. The output of each
+        command is bounded by `self.max_memory` as that of `self.cmd`.
+
+        @param commands:     A commands tuple or list.
+        @param max_sessions: Maximum number of channels open at the same time,
+                             default `self.max_sessions`.
+        @param timeout:      Timeout waiting for the output of any command,
+                             default permanent.
+        @param bufsize:      Buffer size, default permanent.
+        @param get_pty:      Whether to enable pseudo-terminal, default False.
+        @param env:          A dictionary of environment variables. Indication:
+                             server may reject environment variables.
+        @param deadline:     Time limit (in seconds, or a `Deadline`) of all
+                             the commands together, the channels still open
+                             are closed when it is reached.
+        """
+
     def cmd_async(
+            self,
+            command: str,
+            *,
+            timeout: int  = None,
+            bufsize: int  = None,
+            get_pty: bool = None,
+            env:     dict = None,
+            deadline: Union[float, Deadline] = None
+    ) -> 'Future[Command]':
+        """Run `self.cmd` in `self.executor`, the `Future` gives the
+        `Command` or the exception raised. Gather many with
+        `concurrent.futures.as_completed` or `wait`, a command still queued
+        can be cancelled. If the executor queue is full, the call waits for
+        a place (back-pressure), see `CommandExecutor`.
+
+        @param command: A command string.
+        @param timeout: Execute command timeout, default permanent.
+        @param bufsize: Buffer size, default permanent.
+        @param get_pty: Whether to enable pseudo-terminal, default False.
+        @param env:     A dictionary of environment variables. Indication:
+                        server may reject environment variables.
+        @param deadline: Time limit (in seconds, or a `Deadline`), counted
+                         from now, the time queued included.
+        """
+        return self.executor.submit(
+            self.cmd,
+            command=command,
+            timeout=timeout,
+            bufsize=bufsize,
+            get_pty=get_pty,
+            env=env,
+            deadline=deadline
+        )
+
+    def put(
+            self,
+            local:      str,
+            remote:     str,
+            *,
+            workers:    int  = 4,
+            chunk_size: int  = 8 << 20,
+            resume:     bool = False,
+            callback:   Callable[[int, int], Any] = None
+    ) -> int:
+        """Upload a local file over SFTP. The file is cut into chunks, and
+        each worker uploads chunks on its own SFTP channel with pipelined
+        write requests, so a high-latency link is not idle waiting for the
+        acknowledgements. Return the number of bytes uploaded.
+
+        @param local:      Local file path.
+        @param remote:     Remote file path, overwritten if it exists.
+        @param workers:    Number of SFTP channels used at the same time.
+        @param chunk_size: Size of the chunks handed out to the workers, a
+                           file smaller than it is uploaded by one worker.
+        @param resume:     Continue an interrupted upload of the same file,
+                           with the same `workers` and `chunk_size`, instead
+                           of starting over. The last `workers` chunks that
+                           may be incomplete are sent again.
+        @param callback:   Called with (bytes_transferred, total_bytes) as
+                           the transfer progresses, from the worker threads.
+        """
+        with self.open_sftp() as sftp:
+            sftp.put(local, remote, callback=callback)
+        return os.path.getsize(local)
+
+    def get(
+            self,
+            remote:     str,
+            local:      str,
+            *,
+            workers:    int  = 4,
+            chunk_size: int  = 8 << 20,
+            resume:     bool = False,
+            callback:   Callable[[int, int], Any] = None
+    ) -> int:
+        """Download a remote file over SFTP, the counterpart of `put`, with
+        prefetched read requests. Return the number of bytes downloaded.
+
+        @param remote:     Remote file path.
+        @param local:      Local file path, overwritten if it exists.
+        @param workers:    Number of SFTP channels used at the same time.
+        @param chunk_size: Size of the chunks handed out to the workers, each
+                           worker may buffer up to one chunk in memory.
+        @param resume:     Continue an interrupted download, see `put`.
+        @param callback:   Called with (bytes_transferred, total_bytes) as
+                           the transfer progresses, from the worker threads.
+        """
+        with self.open_sftp() as sftp:
+            return sftp.get(remote, local, callback=callback).st_size
+
+    def sync(
+            self,
+            local_dir:  str,
+            remote_dir: str,
+            *,
+            delete:     bool = False,
+            dry_run:    bool = False,
+            workers:    int  = 4,
+            timeout:    int  = None
+    ) -> 'SyncReport':
+        """Make the remote directory a copy of the local directory, sending
+        only the files that are new or changed. The size, mode and sha256 of
+        all remote files are fetched by one command, and the local files are
+        hashed only if their size matches. Each file is uploaded next to its
+        target and renamed over it.
+
+        @param local_dir:  Local directory.
+        @param remote_dir: Remote directory, created if it does not exist.
+        @param delete:     Delete the remote files absent from `local_dir`.
+        @param dry_run:    Only compare, return the report without changing
+                           anything.
+        @param workers:    Number of files uploaded at the same time.
+        @param timeout:    Timeout of the listing, mkdir and rm commands,
+                           default permanent.
+        """
+        return SyncReport(local_dir, remote_dir, dry_run=dry_run)
+
+
+class SyncReport:
+    """What `GqylpySSH.sync` did, or would do if `dry_run`. The file lists
+    hold paths relative to the synced directories, with "/" separators."""
+
+    def __init__(self, local_dir: str, remote_dir: str, *, dry_run: bool):
+        self.local_dir  = local_dir
+        self.remote_dir = remote_dir
+        self.dry_run    = dry_run
+
+        self.added:     list = []
+        self.changed:   list = []
+        self.chmoded:   list = []
+        # Files whose content is unchanged but the mode was updated.
+
+        self.deleted:   list = []
+        self.unchanged: list = []
+
+        self.bytes: int = 0
+        # Bytes of the added and changed files.
+
+        self.timings: dict = {}
+        # Seconds spent in each phase: "scan", "list", "compare", "transfer"
+        # and "delete", the last two are absent if there is nothing to do.
+
+    def __bool__(self) -> bool:
+        """Whether there is anything to add, change, chmod or delete."""
+
+
+class AsyncGqylpySSH(GqylpySSH):
+    """The asyncio version of `GqylpySSH`. The instance is not connected when
+    created, call `await self.aconnect()` or use `async with`:
+
+        >>> async with AsyncGqylpySSH('192.168.1.7', username=...) as ssh:
+        ...     c: Command = await ssh.acmd('echo Hi, GQYLPY')
+
+    The channels are driven by the event loop through non-blocking readiness,
+    so many commands can be in flight without a thread for each of them.
+    """
+
+    def __init__(self, hostname: str, port: int = 22, **params):
+        """Same parameters as `GqylpySSH`, but does not connect."""
+
+    async def aconnect(self) -> None:
+        """Connect to the remote host without blocking the event loop."""
+
+    async def acmd(
             self,
             command: str,
             *,
@@ -355,7 +1274,7 @@ class GqylpySSH(paramiko.SSHClient):
             bufsize: int  = None,
             get_pty: bool = None,
             env:     dict = None
-    ) -> 'threading.Thread':
+    ) -> 'Command':
         """
         @param command: A command string.
         @param timeout: Execute command timeout, default permanent.
@@ -364,37 +1283,65 @@ class GqylpySSH(paramiko.SSHClient):
         @param env:     A dictionary of environment variables. Indication:
                         server may reject environment variables.
         """
-        thread = threading.Thread(
-            target=self.cmd,
-            kwargs={
-                'command': command,
-                'timeout': timeout,
-                'bufsize': bufsize,
-                'get_pty': get_pty,
-                'env': env
-            },
-            name=f'AsyncSSHCommand({command})',
-            daemon=True
-        )
-        thread.start()
-        return thread
+
+    async def acmd_many(
+            self,
+            commands: Union[list, tuple],
+            *,
+            timeout: int  = None,
+            bufsize: int  = None,
+            get_pty: bool = None,
+            env:     dict = None
+    ) -> AsyncGenerator:
+        """
+        @param commands: A commands tuple or list.
+        @param timeout:  Execute command timeout, default permanent.
+        @param bufsize:  Buffer size, default permanent.
+        @param get_pty:  Whether to enable pseudo-terminal, default False.
+        @param env:      A dictionary of environment variables. Indication:
+                         server may reject environment variables.
+        """
 
 
 class Command:
 
-    def __init__(self, command: str, *a):
-        self.command: str = command
+    def __init__(
+            self,
+            command:     str,
+            stdout:      Union[paramiko.ChannelFile, bytes],
+            stderr:      Union[paramiko.ChannelStderrFile, bytes],
+            *,
+            exit_status: int  = None,
+            exit_signal: str  = None,
+            sentinel:    bool = False,
+            max_memory:  int  = None,
+            encoding:    str  = 'utf-8',
+            errors:      str  = 'strict'
+    ):
+        self.command:  str = command
+        self.encoding: str = encoding
+        self.errors:   str = errors
+
+        self.stdout: Union[bytes, mmap.mmap]
+        self.stderr: Union[bytes, mmap.mmap]
+        # Memory-mapped temporary files if larger than `max_memory`.
+
+        self.exit_status: int = exit_status
+        # Exit status of the remote process, -1 if it was killed by a signal.
+
+        self.exit_signal: str = exit_signal
+        # Signal name (without "SIG") if the remote process was killed by it.
+
+        self.status: bool = exit_status == 0
+        # Whether the command was executed successfully.
 
     def raise_if_error(self) -> None:
         if not self.status:
             raise SSHCommandError
 
-    @property
-    def status(self) -> bool:
-        return True if command_exitcode == 0 else False
-
     @property
     def output(self) -> str:
+        """stdout and stderr joined and decoded, decoded once and cached."""
         return process(command_output)
 
     @property
@@ -408,6 +1355,12 @@ class Command:
     def output_else_define(self, define=None) -> Any:
         return self.output if self.status else define
 
+    @property
+    def spilled(self) -> bool:
+        """Whether stdout or stderr was spooled into a temporary file, then
+        `contain`, `line2list` and `table2dict` scan the mapped file without
+        loading it, but `output` still loads all of it."""
+
     def contain(self, string: str, *, ignore_case: bool = False) -> bool:
         output: str = self.output
         if ignore_case:
@@ -432,6 +1385,252 @@ class Command:
     def line2list(self, *, split: str = None) -> Generator:
         """Convert to list by line."""
 
+    def table(
+            self,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False
+    ) -> 'Table':
+        """Parse the titled output into a `Table`, see `Table` for the
+        parameters. Unlike `table2dict`, rows are tuples and the column
+        titles are parsed only once."""
+
+
+class CommandStream:
+    """The output of a running command, returned by `GqylpySSH.stream`.
+    Iterating over it yields stdout lines, stdout and stderr are drained
+    together so that neither side stalls the remote process."""
+
+    def __init__(
+            self,
+            command:  str,
+            channel:  paramiko.Channel,
+            *,
+            encoding: str = 'utf-8',
+            errors:   str = 'strict',
+            decompressor   = None
+    ):
+        self.command  = command
+        self.channel  = channel
+        self.encoding = encoding
+        self.errors   = errors
+
+        self.decompressor = decompressor
+        # A `zlib` or `zstandard` decompression object if the output is
+        # compressed on the remote host, None otherwise.
+
+    def close(self) -> None:
+        """Close the channel, the remote process will get SIGPIPE/SIGHUP."""
+
+    @property
+    def exit_status(self) -> int:
+        """Exit status of the command, blocks until the stream ends."""
+
+    @property
+    def status(self) -> bool:
+        """Whether the exit status is 0, blocks until the stream ends."""
+
+    def chunks(self, size: int = None) -> Generator:
+        """Yield tuple (1, stdout_chunk) or (2, stderr_chunk) in bytes, of
+        at most `size` bytes, default the read size of the profile (32768
+        without one)."""
+
+    def lines(self) -> Generator:
+        """Yield tuple (1, stdout_line) or (2, stderr_line) in str."""
+
+    def line2list(self, *, split: str = None) -> Generator:
+        """Convert stdout to list by line lazily, raise `SSHCommandError` at
+        the end of the stream if the command failed."""
+
+    def table2dict(self, *, split: str = None) -> Generator:
+        """Convert the titled stdout to dictionary lazily."""
+
+    def table(
+            self,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False
+    ) -> 'Table':
+        """Parse the titled stdout into a `Table` lazily, see `Table`."""
+
+
+class Table:
+    """Columnar view of a titled command output such as `ps aux`, `df -h`
+    or `docker ps`, returned by `Command.table` and `CommandStream.table`.
+    Iterating over it yields one tuple per row, in the order of `columns`.
+    The rows are parsed lazily and kept, it can be iterated again, indexed
+    and measured like a list.
+
+        >>> t = cmd('df -h').table(convert=True)
+        >>> t.columns
+        ('Filesystem', 'Size', 'Used', 'Avail', 'Use%', 'Mounted on')
+        >>> t.to_columns()['Use%']
+        [42.0, 0.0]
+    """
+
+    def __init__(
+            self,
+            lines,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False,
+            sample:      int  = 100
+    ):
+        """
+        @param lines:       Iterable of lines, the first one is the titles.
+        @param split:       Cell separator, if specified, each line is split
+                            by it and `fixed_width` is ignored.
+        @param fixed_width: Whether the output is aligned in fixed-width
+                            columns whose titles or cells may contain spaces
+                            (e.g. "Mounted on", "2 hours ago"). The column
+                            boundaries are then detected from the blank
+                            positions shared by the titles and the sampled
+                            rows. Defaults to None, detect it automatically,
+                            use the (faster) whitespace split whenever it
+                            cuts the sampled rows the same way.
+        @param convert:     Convert numeric cells, "12" to 12, "1.5" to 1.5,
+                            "45%" to 45.0 and sizes such as "1.5G" to bytes.
+                            The kind of each column is detected from the
+                            sampled rows, a column of text is not converted.
+        @param sample:      Number of rows used for the detection.
+        """
+        self.columns: Tuple[str, ...]
+        # Column titles.
+
+    def __iter__(self) -> Generator:
+        """Yield one tuple per row, missing trailing cells are None."""
+
+    def __len__(self) -> int:
+        """Number of rows, all of them are parsed."""
+
+    def __getitem__(self, index) -> tuple:
+        """Row (or list of rows for a slice), all of them are parsed."""
+
+    def to_columns(self) -> dict:
+        """Consume the rows, return {title: [cell, ...]}."""
+
+
+class ShellSession:
+    """A remote shell kept open on one channel, returned by `GqylpySSH.shell`.
+    Commands are written to the shell framed by unique markers, and each
+    response is parsed into a normal `Command`. The working directory and
+    exported variables persist between commands, and each command costs only
+    one write/read round trip.
+
+        >>> with ssh.shell() as sh:
+        ...     sh.cmd('cd /var/log; export LANG=C')
+        ...     sh.cmd('ls').output
+
+    The shell is not attached to a pseudo-terminal, so stdout and stderr stay
+    separate. Commands must not read from stdin, it is detached.
+    """
+
+    def __init__(
+            self,
+            gobj:    GqylpySSH,
+            *,
+            timeout: int  = None,
+            env:     dict = None
+    ):
+        self.gobj    = gobj
+        self.timeout = timeout
+        self.env     = env
+        self.channel: paramiko.Channel
+
+    def close(self) -> None:
+        """Close the shell channel."""
+
+    def cmd(self, command: str, *, timeout: int = None) -> Command:
+        """Execute a command in the shell. If the previous command timed out,
+        resync first, and open a new shell (the state is lost) if that fails.
+        If the shell has exited, a new one is opened.
+
+        @param command: A command string.
+        @param timeout: Timeout waiting for the output, default `self.timeout`.
+        """
+
+    def resync(self, timeout: int = 5) -> bool:
+        """Discard any pending output until a fresh marker comes back, return
+        False if it does not come back in time (e.g. a command hangs)."""
+
+
+class HostGroup:
+    """Run commands on many remote hosts in parallel.
+
+        >>> group = HostGroup(['192.168.1.7', '192.168.1.8:2222'], username=...)
+        >>> for gobj, c in group.cmd('uname -r'):
+        ...     print(gobj.hostname, c.output)
+
+    Results are yielded as they finish, not in the order of the hosts. If a
+    host raised an exception, the exception is yielded in place of the result.
+    A host that failed to connect (see `errors`) is yielded first, as its
+    hostname with the exception of the connect.
+    """
+
+    def __init__(
+            self,
+            hosts:           Union[list, tuple],
+            *,
+            connect_workers: int = 16,
+            cmd_workers:     int = 64,
+            **params
+    ):
+        """
+        @param hosts:           Hostnames ("host" or "host:port") or GqylpySSH
+                                instances, hostnames are connected in parallel.
+        @param connect_workers: Maximum number of hosts connected concurrently.
+        @param cmd_workers:     Maximum number of hosts executing commands
+                                concurrently.
+        @param params:          Parameters passed to `GqylpySSH` for each
+                                hostname.
+        """
+        self.cmd_workers = cmd_workers
+
+        self.gobjs: list
+        # GqylpySSH instances connected successfully.
+
+        self.errors: dict
+        # hostname -> exception, hosts that failed to connect.
+
+    def close(self) -> None:
+        """Close the worker pool and all connections."""
+
+    def cmd(
+            self,
+            command: str,
+            *,
+            timeout: int  = None,
+            bufsize: int  = None,
+            get_pty: bool = None,
+            env:     dict = None,
+            deadline: Union[float, Deadline] = None
+    ) -> Generator:
+        """Execute a command on all hosts, yield tuple (GqylpySSH, Command).
+
+        With `deadline` (seconds, or a `Deadline` shared by all the hosts),
+        the hosts not finished in time yield `socket.timeout` by then, even
+        those stuck outside the reads (e.g. connecting), and their channels
+        are closed so that the workers are released."""
+
+    def cmd_many(
+            self,
+            commands: Union[list, tuple],
+            *,
+            batch:   bool = False,
+            timeout: int  = None,
+            bufsize: int  = None,
+            get_pty: bool = None,
+            env:     dict = None,
+            deadline: Union[float, Deadline] = None
+    ) -> Generator:
+        """Execute commands on all hosts, yield tuple (GqylpySSH, [Command]).
+
+        If a host fails (e.g. at the `deadline`), its exception is yielded
+        with attribute `results`, the commands finished before."""
+
 
 def gname2gobj(func):
     def inner(*a, gname: Union[str, GqylpySSH] = None, **kw) -> Command:
@@ -451,10 +1650,14 @@ def gname2gobj(func):
 def cmd(
         command: str,
         *,
-        timeout: int  = None,
-        bufsize: int  = None,
-        get_pty: bool = None,
-        env:     dict = None,
+        timeout: int   = None,
+        bufsize: int   = None,
+        get_pty: bool  = None,
+        env:     dict  = None,
+        ttl:     float = None,
+        stdin:   Union[bytes, str, BinaryIO, Iterator] = None,
+        compress: Union[bool, str] = None,
+        deadline: Union[float, Deadline] = None,
         gname:   Union[str, GqylpySSH] = None
 ) -> Command:
     """
@@ -464,6 +1667,12 @@ def cmd(
     @param get_pty: Whether to enable pseudo-terminal, default False.
     @param env:     A dictionary of environment variables. Indication:
                     server may reject environment variables.
+    @param ttl:     Cache the successful result for this many seconds.
+    @param stdin:   Data piped to the remote process, bytes, a readable file
+                    or an iterator of chunks.
+    @param compress: Compress the output on the remote host, True, "zstd" or
+                     "gzip".
+    @param deadline: Time limit in seconds, or a `Deadline`.
     @param gname:   GqylpySSH instance or pointer name of GqylpySSH instance.
     """
     return (gname or __first__).cmd(
@@ -471,7 +1680,11 @@ def cmd(
         timeout=timeout,
         bufsize=bufsize,
         get_pty=get_pty,
-        env=env
+        env=env,
+        ttl=ttl,
+        stdin=stdin,
+        compress=compress,
+        deadline=deadline
     )
 
 
@@ -479,27 +1692,199 @@ def cmd(
 def cmd_many(
         commands: Union[list, tuple],
         *,
+        batch:   bool = False,
         timeout: int  = None,
         bufsize: int  = None,
         get_pty: bool = None,
         env:     dict = None,
+        compress: Union[bool, str] = None,
+        deadline: Union[float, Deadline] = None,
         gname:   Union[str, GqylpySSH] = None
 ) -> Generator:
     """
     @param commands: A commands tuple or list.
+    @param batch:    Send all commands as one remote script in a single channel.
     @param timeout:  Execute command timeout, default permanent.
     @param bufsize:  Buffer size, default permanent.
     @param get_pty:  Whether to enable pseudo-terminal, default False.
     @param env:      A dictionary of environment variables. Indication:
                      server may reject environment variables.
+    @param compress: Compress the output on the remote host, True, "zstd" or
+                     "gzip".
+    @param deadline: Time limit in seconds, or a `Deadline`.
     @param gname:    GqylpySSH instance or pointer name of GqylpySSH instance.
     """
     return (gname or __first__).cmd_many(
         commands=commands,
+        batch=batch,
+        timeout=timeout,
+        bufsize=bufsize,
+        get_pty=get_pty,
+        env=env,
+        compress=compress,
+        deadline=deadline
+    )
+
+
+@gname2gobj
+def cmd_mux(
+        commands:     Union[list, tuple],
+        *,
+        max_sessions: int  = None,
+        timeout:      int  = None,
+        bufsize:      int  = None,
+        get_pty:      bool = None,
+        env:          dict = None,
+        deadline:     Union[float, Deadline] = None,
+        gname:        Union[str, GqylpySSH] = None
+) -> Generator:
+    """
+    @param commands:     A commands tuple or list.
+    @param max_sessions: Maximum number of channels open at the same time.
+    @param timeout:      Timeout waiting for the output of any command, default
+                         permanent.
+    @param bufsize:      Buffer size, default permanent.
+    @param get_pty:      Whether to enable pseudo-terminal, default False.
+    @param env:          A dictionary of environment variables. Indication:
+                         server may reject environment variables.
+    @param deadline:     Time limit in seconds, or a `Deadline`.
+    @param gname:        GqylpySSH instance or pointer name of GqylpySSH
+                         instance.
+    """
+    return (gname or __first__).cmd_mux(
+        commands=commands,
+        max_sessions=max_sessions,
         timeout=timeout,
         bufsize=bufsize,
         get_pty=get_pty,
-        env=env
+        env=env,
+        deadline=deadline
+    )
+
+
+@gname2gobj
+def stream(
+        command: str,
+        *,
+        timeout: int  = None,
+        bufsize: int  = None,
+        get_pty: bool = None,
+        env:     dict = None,
+        compress: Union[bool, str] = None,
+        gname:   Union[str, GqylpySSH] = None
+) -> CommandStream:
+    """
+    @param command: A command string.
+    @param timeout: Timeout waiting for the next output, default permanent.
+    @param bufsize: Buffer size, default permanent.
+    @param get_pty: Whether to enable pseudo-terminal, default False.
+    @param env:     A dictionary of environment variables. Indication:
+                    server may reject environment variables.
+    @param compress: Compress the output on the remote host, True, "zstd" or
+                     "gzip".
+    @param gname:   GqylpySSH instance or pointer name of GqylpySSH instance.
+    """
+    return (gname or __first__).stream(
+        command=command,
+        timeout=timeout,
+        bufsize=bufsize,
+        get_pty=get_pty,
+        env=env,
+        compress=compress
+    )
+
+
+@gname2gobj
+def put(
+        local:      str,
+        remote:     str,
+        *,
+        workers:    int  = 4,
+        chunk_size: int  = 8 << 20,
+        resume:     bool = False,
+        callback:   Callable[[int, int], Any] = None,
+        gname:      Union[str, GqylpySSH] = None
+) -> int:
+    """
+    @param local:      Local file path.
+    @param remote:     Remote file path.
+    @param workers:    Number of SFTP channels used at the same time.
+    @param chunk_size: Size of the chunks handed out to the workers.
+    @param resume:     Continue an interrupted upload instead of starting over.
+    @param callback:   Called with (bytes_transferred, total_bytes).
+    @param gname:      GqylpySSH instance or pointer name of GqylpySSH
+                       instance.
+    """
+    return (gname or __first__).put(
+        local=local,
+        remote=remote,
+        workers=workers,
+        chunk_size=chunk_size,
+        resume=resume,
+        callback=callback
+    )
+
+
+@gname2gobj
+def get(
+        remote:     str,
+        local:      str,
+        *,
+        workers:    int  = 4,
+        chunk_size: int  = 8 << 20,
+        resume:     bool = False,
+        callback:   Callable[[int, int], Any] = None,
+        gname:      Union[str, GqylpySSH] = None
+) -> int:
+    """
+    @param remote:     Remote file path.
+    @param local:      Local file path.
+    @param workers:    Number of SFTP channels used at the same time.
+    @param chunk_size: Size of the chunks handed out to the workers.
+    @param resume:     Continue an interrupted download instead of starting
+                       over.
+    @param callback:   Called with (bytes_transferred, total_bytes).
+    @param gname:      GqylpySSH instance or pointer name of GqylpySSH
+                       instance.
+    """
+    return (gname or __first__).get(
+        remote=remote,
+        local=local,
+        workers=workers,
+        chunk_size=chunk_size,
+        resume=resume,
+        callback=callback
+    )
+
+
+@gname2gobj
+def sync(
+        local_dir:  str,
+        remote_dir: str,
+        *,
+        delete:     bool = False,
+        dry_run:    bool = False,
+        workers:    int  = 4,
+        timeout:    int  = None,
+        gname:      Union[str, GqylpySSH] = None
+) -> SyncReport:
+    """
+    @param local_dir:  Local directory.
+    @param remote_dir: Remote directory.
+    @param delete:     Delete the remote files absent from `local_dir`.
+    @param dry_run:    Only compare, return the report.
+    @param workers:    Number of files uploaded at the same time.
+    @param timeout:    Timeout of the remote commands, default permanent.
+    @param gname:      GqylpySSH instance or pointer name of GqylpySSH
+                       instance.
+    """
+    return (gname or __first__).sync(
+        local_dir=local_dir,
+        remote_dir=remote_dir,
+        delete=delete,
+        dry_run=dry_run,
+        workers=workers,
+        timeout=timeout
     )
 
 
@@ -511,8 +1896,9 @@ def cmd_async(
         bufsize: int  = None,
         get_pty: bool = None,
         env:     dict = None,
+        deadline: Union[float, Deadline] = None,
         gname:   Union[str, GqylpySSH] = None
-) -> threading.Thread:
+) -> 'Future[Command]':
     """
     @param command: A command string.
     @param timeout: Execute command timeout, default permanent.
@@ -520,6 +1906,7 @@ def cmd_async(
     @param get_pty: Whether to enable pseudo-terminal, default False.
     @param env:     A dictionary of environment variables. Indication:
                     server may reject environment variables.
+    @param deadline: Time limit in seconds, or a `Deadline`.
     @param gname:   GqylpySSH instance or pointer name of GqylpySSH instance.
     """
     return (gname or __first__).cmd_async(
@@ -527,7 +1914,8 @@ def cmd_async(
         timeout=timeout,
         bufsize=bufsize,
         get_pty=get_pty,
-        env=env
+        env=env,
+        deadline=deadline
     )
 
 
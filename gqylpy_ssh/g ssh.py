@@ -15,22 +15,68 @@ PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
 You should have received a copy of the GNU Lesser General Public License along
 with gqylpy-ssh. If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+import re
+import time
+import mmap
+import stat
+import uuid
+import zlib
+import heapq
+import queue
+import shlex
+import socket
+import random
+import codecs
+import bisect
+import select
+import base64
+import weakref
+import asyncio
+import hashlib
 import builtins
+import tempfile
 import warnings
+import posixpath
 import functools
+import itertools
 import threading
+import collections
 
 import paramiko
 
 from paramiko import SSHClient
+from paramiko import Message
+from paramiko import Transport
 from paramiko import AutoAddPolicy
 
 from paramiko.ssh_exception import SSHException
 from paramiko.ssh_exception import NoValidConnectionsError
 
+from paramiko.common import MSG_CHANNEL_REQUEST
+from paramiko.common import cMSG_CHANNEL_OPEN
+from paramiko.common import cMSG_CHANNEL_REQUEST
+from paramiko.common import cMSG_GLOBAL_REQUEST
+from paramiko.common import DEFAULT_WINDOW_SIZE
+from paramiko.common import DEFAULT_MAX_PACKET_SIZE
+
+from paramiko.channel import Channel
 from paramiko.channel import ChannelFile
 from paramiko.channel import ChannelStderrFile
 
+from concurrent.futures import Future
+from concurrent.futures import CancelledError
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 first: 'GqylpySSH'
 
 gpack = __import__(__package__)
@@ -59,31 +105,1334 @@ def __init__(
     setattr(gpack, gname, gobj)
 
 
+def connect_all(*, concurrency: int = 16) -> dict:
+    # The instances registered by `__init__(..., gname=...)` that are not
+    # connected yet (created with lazy=True or closed) are connected in
+    # parallel, so the startup costs about one handshake instead of N.
+    gobjs: dict = {
+        gname: gobj for gname, gobj in vars(gpack).items()
+        if isinstance(gobj, GqylpySSH) and gobj._transport is None
+    }
+    errors: dict = {}
+    if not gobjs:
+        return errors
+    with ThreadPoolExecutor(
+            min(concurrency, len(gobjs)), thread_name_prefix='SSHConnect'
+    ) as executor:
+        futures: dict = {
+            executor.submit(
+                gobj.get_transport if gobj.lazy else gobj._connect
+            ): gname for gname, gobj in gobjs.items()
+        }
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                errors[futures[future]] = future.exception()
+    return errors
+
+
+_jumps: dict = {}
+_jumps_lock = threading.Lock()
+
+_JUMP_PARAMS = (
+    'username', 'password', 'pkey', 'key_filename', 'passphrase', 'timeout',
+    'banner_timeout', 'auth_timeout', 'allow_agent', 'look_for_keys',
+    'disabled_algorithms', 'transport_factory', 'jump'
+)
+
+
+def _jump_host(jump, params: dict) -> 'GqylpySSH':
+    # `jump` is a GqylpySSH instance, a "[user@]host[:port]" string or a list
+    # of them, the hops in order. A string hop is authenticated as the target
+    # is (except the username), and the jump hosts made of strings are shared
+    # process-wide, so the targets behind one bastion use one connection.
+    # They are keyed by host, port, username and the hop before (an instance,
+    # compared by identity), the first target to use one sets the rest.
+    if isinstance(jump, GqylpySSH):
+        return jump
+    if jump.__class__ in (list, tuple):
+        hop: GqylpySSH = None
+        for x in jump:
+            hop = _jump_host(x, {**params, 'jump': hop})
+        return hop
+    if jump.__class__ is not str:
+        x: str = jump.__class__.__name__
+        raise TypeError(
+            'parameter "jump" type must be a "str", GqylpySSH '
+            f'instance or list of them, not "{x}".'
+        )
+
+    username, _, host = jump.rpartition('@')
+    hostname, _, port = host.rpartition(':')
+    if not (hostname and port.isdigit() and ':' not in hostname):
+        hostname, port = host, 22
+    params: dict = {
+        k: v for k, v in params.items() if k in _JUMP_PARAMS
+    }
+    if username:
+        params['username'] = username
+    key: tuple = (
+        hostname, int(port), params.get('username'), params.get('jump')
+    )
+    with _jumps_lock:
+        gobj: GqylpySSH = _jumps.get(key)
+        if gobj is None:
+            gobj = _jumps[key] = GqylpySSH(
+                hostname, int(port), lazy=True, **params
+            )
+    return gobj
+
+
+def _handle_channel_request(channel: Channel, m: Message):
+    # paramiko only records "exit-status", the "exit-signal" request (RFC 4254
+    # section 6.10) is sent instead when the remote process is killed.
+    position: int = m.packet.tell()
+    if m.get_text() == 'exit-signal':
+        m.get_boolean()
+        channel.exit_signal = m.get_text()
+        channel.status_event.set()
+    else:
+        m.packet.seek(position)
+        Channel._handle_request(channel, m)
+
+
+# The handler above relies on paramiko internals, a paramiko release that
+# changed them keeps its own handling, without `exit_signal`.
+_EXIT_SIGNAL: bool = \
+    MSG_CHANNEL_REQUEST in getattr(Transport, '_channel_handler_table', ()) \
+    and callable(getattr(Channel, '_handle_request', None)) \
+    and hasattr(Channel(0), 'status_event') \
+    and hasattr(Message(), 'packet')
+
+
+class _Transport(Transport):
+    if _EXIT_SIGNAL:
+        _channel_handler_table = {
+            **Transport._channel_handler_table,
+            MSG_CHANNEL_REQUEST: _handle_channel_request
+        }
+
+    # The most bytes taken from a channel buffer at once, set by `Profile`.
+    read_size = 32768
+
+
+def _read_size(channel: Channel) -> int:
+    return getattr(channel.transport, 'read_size', 32768)
+
+
+def _ping(transport: Transport, timeout: float) -> bool:
+    # A round trip through the remote sshd, unlike `Transport.is_active` it
+    # detects half-open connections. The transport is closed on timeout.
+    # The request is sent as `Transport.global_request` does, whose wait
+    # cannot be bounded, the reply (success or failure) sets the event.
+    event = transport.completion_event = threading.Event()
+    m = Message()
+    m.add_byte(cMSG_GLOBAL_REQUEST)
+    m.add_string('keepalive@openssh.com')
+    m.add_boolean(True)
+    transport._send_user_message(m)
+    if not event.wait(timeout):
+        transport.close()
+    return transport.is_active()
+
+
+_pkeys: dict = {}
+_pkeys_lock = threading.Lock()
+
+_PKEY_TYPES = {
+    'ssh-rsa':     paramiko.RSAKey,
+    'ssh-dss':     paramiko.DSSKey,
+    'ssh-ed25519': paramiko.Ed25519Key,
+    'RSA':         paramiko.RSAKey,
+    'DSA':         paramiko.DSSKey,
+    'EC':          paramiko.ECDSAKey
+}
+
+
+def _load_pkey(filename: str, passphrase: str = None) -> paramiko.PKey:
+    # Decrypting a key protected by bcrypt costs hundreds of milliseconds,
+    # so the keys are cached for the process. A rewritten file (new mtime)
+    # or another passphrase loads the key again, and concurrent loads of the
+    # same key wait for the first one instead of decrypting it again.
+    path: str = os.path.realpath(os.path.expanduser(filename))
+    key: tuple = (
+        path,
+        os.stat(path).st_mtime_ns,
+        passphrase and hashlib.sha256(passphrase.encode()).hexdigest()
+    )
+    with _pkeys_lock:
+        entry: list = _pkeys.get(key)
+        if entry is None:
+            for stale in [k for k in _pkeys if k[0] == path]:
+                del _pkeys[stale]
+            entry = _pkeys[key] = [threading.Lock(), None]
+    with entry[0]:
+        if entry[1] is None:
+            entry[1] = _read_pkey(path, passphrase)
+        return entry[1]
+
+
+def _read_pkey(path: str, passphrase: str = None) -> paramiko.PKey:
+    # The key type is read from the unencrypted header, so the key is
+    # decrypted only once, by the right class.
+    with open(path) as f:
+        text: str = f.read()
+    m = re.search(
+        r'-----BEGIN ([A-Z]+) PRIVATE KEY-----\s+(?:.+:.+\s+)*([^-]+)', text
+    )
+    key_type: str = m and m[1]
+    if key_type == 'OPENSSH':
+        try:
+            blob: bytes = base64.b64decode(''.join(m[2].split()))
+            header = Message(blob[len(b'openssh-key-v1\0'):])
+            for _ in range(3):  # cipher, kdf and kdf options
+                header.get_string()
+            header.get_int()
+            key_type = Message(header.get_binary()).get_text()
+        except Exception:
+            key_type = None
+    key_class: type = _PKEY_TYPES.get(key_type)
+    if key_class is None and key_type and key_type.startswith('ecdsa-'):
+        key_class = paramiko.ECDSAKey
+    if key_class is not None:
+        return key_class.from_private_key_file(path, passphrase)
+
+    error = None
+    for key_class in (
+            paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey
+    ):
+        try:
+            return key_class.from_private_key_file(path, passphrase)
+        except paramiko.PasswordRequiredException:
+            raise
+        except SSHException as e:
+            error = e
+    raise error
+
+
+class ConnectionPool:
+
+    def __init__(
+            self,
+            *,
+            max_per_host:     int   = 4,
+            idle_timeout:     float = 300,
+            ping_after:       float = 30,
+            ping_timeout:     float = 5,
+            checkout_timeout: float = None
+    ):
+        self.max_per_host     = max_per_host
+        self.idle_timeout     = idle_timeout
+        self.ping_after       = ping_after
+        self.ping_timeout     = ping_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+        self.__idle  = {}
+        self.__total = {}
+        self.__cond  = threading.Condition()
+
+    @property
+    def stats(self) -> dict:
+        with self.__cond:
+            idle: int = sum(len(x) for x in self.__idle.values())
+            return {
+                'hits'     : self.hits,
+                'misses'   : self.misses,
+                'evictions': self.evictions,
+                'idle'     : idle,
+                'active'   : sum(self.__total.values()) - idle
+            }
+
+    def checkout(self, key: tuple, connect) -> Transport:
+        deadline: float = None if self.checkout_timeout is None \
+            else time.monotonic() + self.checkout_timeout
+        while True:
+            with self.__cond:
+                self.__evict()
+                idle: list = self.__idle.get(key)
+                if idle:
+                    transport, released = idle.pop()
+                elif self.__total.get(key, 0) < self.max_per_host:
+                    self.__total[key] = self.__total.get(key, 0) + 1
+                    self.misses += 1
+                    break
+                else:
+                    timeout = None if deadline is None \
+                        else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0 \
+                            or not self.__cond.wait(timeout):
+                        raise SSHException(
+                            f'no connection available for {key[:3]} in the '
+                            f'pool, all {self.max_per_host} are checked out.'
+                        )
+                    continue
+            if transport.is_active() and (
+                    time.monotonic() - released < self.ping_after
+                    or _ping(transport, self.ping_timeout)
+            ):
+                with self.__cond:
+                    self.hits += 1
+                return transport
+            self.discard(key, transport)
+        try:
+            return connect()
+        except BaseException:
+            with self.__cond:
+                self.__total[key] -= 1
+                self.__cond.notify()
+            raise
+
+    def checkin(self, key: tuple, transport: Transport):
+        if not transport.is_active():
+            return self.discard(key, transport)
+        with self.__cond:
+            self.__idle.setdefault(key, []).append(
+                (transport, time.monotonic())
+            )
+            self.__evict()
+            self.__cond.notify()
+
+    def discard(self, key: tuple, transport: Transport):
+        transport.close()
+        with self.__cond:
+            self.__total[key] -= 1
+            self.evictions += 1
+            self.__cond.notify()
+
+    def evict(self):
+        with self.__cond:
+            self.__evict()
+
+    def clear(self):
+        with self.__cond:
+            for key, idle in self.__idle.items():
+                for transport, _ in idle:
+                    transport.close()
+                self.__total[key] -= len(idle)
+                self.evictions += len(idle)
+            self.__idle.clear()
+            self.__cond.notify_all()
+
+    def __evict(self):
+        expire: float = time.monotonic() - self.idle_timeout
+        for key, idle in self.__idle.items():
+            while idle and idle[0][1] < expire:
+                idle.pop(0)[0].close()
+                self.__total[key] -= 1
+                self.evictions += 1
+
+
+ConnectionPool.default = ConnectionPool()
+
+
+class ResultCache:
+
+    def __init__(self, *, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.size      = 0
+
+        self.__entries = collections.OrderedDict()
+        self.__lock    = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'hits'     : self.hits,
+                'misses'   : self.misses,
+                'evictions': self.evictions,
+                'entries'  : len(self.__entries),
+                'bytes'    : self.size
+            }
+
+    def get(self, key: tuple) -> 'Command':
+        with self.__lock:
+            entry: tuple = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self.__pop(key)
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, command: 'Command', ttl: float):
+        size: int = len(command.stdout) + len(command.stderr) \
+            + len(command.command)
+        if size > self.max_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                self.__pop(key)
+            self.__entries[key] = time.monotonic() + ttl, size, command
+            self.size += size
+            while self.size > self.max_bytes:
+                self.__pop(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def invalidate(self, hostname: str = None, command: str = None):
+        with self.__lock:
+            for key in [
+                key for key in self.__entries
+                if hostname in (None, key[0]) and command in (None, key[3])
+            ]:
+                self.__pop(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def __pop(self, key: tuple):
+        self.size -= self.__entries.pop(key)[1]
+
+
+ResultCache.default = ResultCache()
+
+
+class Supervisor:
+
+    def __init__(
+            self,
+            *,
+            ping_timeout: float = 5,
+            backoff:      float = 1,
+            max_backoff:  float = 60,
+            workers:      int   = 8
+    ):
+        self.ping_timeout = ping_timeout
+        self.backoff      = backoff
+        self.max_backoff  = max_backoff
+        self.workers      = workers
+
+        self.pings         = 0
+        self.ping_failures = 0
+
+        self.__lock   = threading.Lock()
+        self.__gobjs  = weakref.WeakSet()
+        self.__queue  = []
+        self.__seq    = itertools.count()
+        self.__cond   = threading.Condition()
+        self.__thread = None
+        self.__executor: ThreadPoolExecutor = None
+
+    @property
+    def stats(self) -> dict:
+        with self.__cond:
+            gobjs: list = list(self.__gobjs)
+        with self.__lock:
+            pings, ping_failures = self.pings, self.ping_failures
+        return {
+            'supervised'   : len(gobjs),
+            'connected'    : sum(x.state == 'connected' for x in gobjs),
+            'reconnecting' : sum(x.state == 'reconnecting' for x in gobjs),
+            'reconnects'   : sum(x.reconnects for x in gobjs),
+            'downtime'     : sum(x.downtime for x in gobjs),
+            'pings'        : pings,
+            'ping_failures': ping_failures
+        }
+
+    def pinged(self, ok: bool):
+        # The checks run in parallel in the thread pool.
+        with self.__lock:
+            self.pings += 1
+            if not ok:
+                self.ping_failures += 1
+
+    def register(self, gobj: 'GqylpySSH'):
+        with self.__cond:
+            if self.__thread is None:
+                self.__executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='SSHSupervisor'
+                )
+                self.__thread = threading.Thread(
+                    target=self.__run, name='SSHSupervisor', daemon=True
+                )
+                self.__thread.start()
+            if gobj not in self.__gobjs:
+                self.__gobjs.add(gobj)
+                self.__schedule(gobj, gobj.keepalive)
+
+    def __schedule(self, gobj: 'GqylpySSH', delay: float):
+        with self.__cond:
+            heapq.heappush(self.__queue, (
+                time.monotonic() + delay, next(self.__seq), weakref.ref(gobj)
+            ))
+            self.__cond.notify()
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                while not self.__queue \
+                        or self.__queue[0][0] > time.monotonic():
+                    self.__cond.wait(
+                        self.__queue[0][0] - time.monotonic()
+                        if self.__queue else None
+                    )
+                _, _, ref = heapq.heappop(self.__queue)
+            gobj: GqylpySSH = ref()
+            if gobj is not None:
+                self.__executor.submit(self.__check, gobj)
+
+    def __check(self, gobj: 'GqylpySSH'):
+        if gobj.keepalive is None:
+            # Closed, or supervision turned off by the user.
+            with self.__cond:
+                self.__gobjs.discard(gobj)
+            return
+        try:
+            failures: int = gobj._heal(self)
+        except Exception:
+            failures: int = 1
+        if failures:
+            # Exponential backoff with jitter, so that the hosts of a rack
+            # that went down together do not reconnect in lockstep.
+            delay: float = min(
+                self.max_backoff, self.backoff * 2 ** (failures - 1)
+            )
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        else:
+            delay: float = gobj.keepalive
+        self.__schedule(gobj, delay)
+
+
+Supervisor.default = Supervisor()
+
+
+_PHASES = 'connect', 'channel_open', 'first_byte', 'total'
+
+
+class Metrics:
+
+    def __init__(
+            self,
+            *,
+            buckets: (tuple, list) = (
+                .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60
+            ),
+            hooks:   (tuple, list) = ()
+    ):
+        self.buckets: tuple = tuple(sorted(buckets))
+        self.hooks:   list  = list(hooks)
+
+        self.__hosts = {}
+        self.__lock  = threading.Lock()
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                f'{hostname}:{port}': {
+                    k: {'count': v[1], 'sum': v[2]} if k in _PHASES else v
+                    for k, v in host.items()
+                } for (hostname, port), host in self.__hosts.items()
+            }
+
+    def span(
+            self, gobj: 'GqylpySSH', command: str, *, kind: str = 'cmd'
+    ) -> 'Span':
+        return Span(self, gobj.hostname, gobj.port, command, kind)
+
+    def observe(self, span: 'Span'):
+        with self.__lock:
+            host: dict = self.__host(span.hostname, span.port)
+            if span.error is not None:
+                host['errors'] += 1
+            elif span.exit_status != 0:
+                host['failures'] += 1
+            host['commands']   += 1
+            host['bytes_in']   += span.bytes_in
+            host['bytes_out']  += span.bytes_out
+            host['reconnects'] += span.reconnects
+            for phase in _PHASES:
+                value: float = getattr(span, phase)
+                if value is not None:
+                    counts, _, _ = histogram = host[phase]
+                    counts[bisect.bisect_left(self.buckets, value)] += 1
+                    histogram[1] += 1
+                    histogram[2] += value
+        for hook in self.hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                # A broken tracer must not break the commands.
+                warnings.warn(f'metrics hook {hook!r} failed: {e!r}')
+
+    def reconnected(self, hostname: str, port: int):
+        with self.__lock:
+            self.__host(hostname, port)['reconnects'] += 1
+
+    def to_prometheus(self, *, prefix: str = 'gqylpy_ssh') -> str:
+        with self.__lock:
+            hosts: list = [
+                (self.__labels(hostname, port), {
+                    k: [list(v[0]), *v[1:]] if k in _PHASES else v
+                    for k, v in host.items()
+                }) for (hostname, port), host in self.__hosts.items()
+            ]
+        lines = [
+            f'# HELP {prefix}_command_seconds Time of the phases of the '
+            'commands: connect, channel_open, first_byte (since the start) '
+            'and total.',
+            f'# TYPE {prefix}_command_seconds histogram'
+        ]
+        for labels, host in hosts:
+            for phase in _PHASES:
+                counts, count, total = host[phase]
+                if not count:
+                    continue
+                cumulative = 0
+                for le, n in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += n
+                    lines.append(
+                        f'{prefix}_command_seconds_bucket{{{labels},'
+                        f'phase="{phase}",le="{le}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{prefix}_command_seconds_sum{{{labels},'
+                    f'phase="{phase}"}} {total}'
+                )
+                lines.append(
+                    f'{prefix}_command_seconds_count{{{labels},'
+                    f'phase="{phase}"}} {count}'
+                )
+        for name, key, description in (
+                ('commands_total', 'commands', 'Commands executed.'),
+                ('command_failures_total', 'failures',
+                 'Commands that exited with a non-zero status.'),
+                ('command_errors_total', 'errors',
+                 'Commands that raised an exception (e.g. timed out).'),
+                ('received_bytes_total', 'bytes_in',
+                 'Output bytes received (stdout and stderr).'),
+                ('sent_bytes_total', 'bytes_out',
+                 'Command and stdin bytes sent.'),
+                ('reconnects_total', 'reconnects', 'Reconnects made.')
+        ):
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for labels, host in hosts:
+                lines.append(f'{prefix}_{name}{{{labels}}} {host[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.__lock:
+            self.__hosts.clear()
+
+    def __host(self, hostname: str, port: int) -> dict:
+        host: dict = self.__hosts.get((hostname, port))
+        if host is None:
+            host = self.__hosts[(hostname, port)] = {
+                'commands'  : 0,
+                'failures'  : 0,
+                'errors'    : 0,
+                'bytes_in'  : 0,
+                'bytes_out' : 0,
+                'reconnects': 0,
+                **{
+                    phase: [[0] * (len(self.buckets) + 1), 0, 0]
+                    for phase in _PHASES
+                }
+            }
+        return host
+
+    @staticmethod
+    def __labels(hostname: str, port: int) -> str:
+        hostname: str = hostname.replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+        return f'host="{hostname}",port="{port}"'
+
+
+Metrics.default = Metrics()
+
+
+class Span:
+
+    def __init__(
+            self,
+            metrics:  Metrics,
+            hostname: str,
+            port:     int,
+            command:  str,
+            kind:     str
+    ):
+        self.metrics  = metrics
+        self.hostname = hostname
+        self.port     = port
+        self.command  = command
+        self.kind     = kind
+        self.start    = time.time()
+
+        self.connect:      float = None
+        self.channel_open: float = None
+        self.first_byte:   float = None
+        self.total:        float = None
+
+        self.bytes_in:    int = 0
+        self.bytes_out:   int = len(command.encode())
+        self.reconnects:  int = 0
+        self.exit_status: int = None
+        self.error: Exception = None
+
+        self.__begin = self.__last = time.monotonic()
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total = time.monotonic() - self.__begin
+        if isinstance(exc, Exception):
+            self.error = exc
+        self.metrics.observe(self)
+
+    def __repr__(self) -> str:
+        return (
+            f'<Span {self.kind} {self.hostname}:{self.port} '
+            f'({self.command}) {self.total}s>'
+        )
+
+    def mark(self, phase: str):
+        # Add the time since the previous mark (or the start) to `phase`.
+        now: float = time.monotonic()
+        setattr(self, phase, (getattr(self, phase) or 0) + now - self.__last)
+        self.__last = now
+
+    def received(self, chunks):
+        for fd, chunk in chunks:
+            if self.first_byte is None:
+                self.first_byte = time.monotonic() - self.__begin
+            self.bytes_in += len(chunk)
+            yield fd, chunk
+
+
+class CommandExecutor(Executor):
+
+    def __init__(
+            self,
+            *,
+            max_workers:    int   = 32,
+            max_pending:    int   = 1024,
+            submit_timeout: float = None
+    ):
+        self.max_workers    = max_workers
+        self.max_pending    = max_pending
+        self.submit_timeout = submit_timeout
+
+        self.submitted = 0
+        self.completed = 0
+        self.rejected  = 0
+
+        self.__queue    = queue.Queue(max_pending)
+        self.__threads  = set()
+        self.__idle     = threading.Semaphore(0)
+        self.__lock     = threading.Lock()
+        self.__shutdown = False
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'workers'  : len(self.__threads),
+                'pending'  : self.__queue.qsize(),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected' : self.rejected
+            }
+
+    def submit(self, fn, *a, **kw) -> Future:
+        if self.__shutdown:
+            raise RuntimeError('cannot submit after shutdown.')
+        future = Future()
+        try:
+            self.__queue.put((future, fn, a, kw), timeout=self.submit_timeout)
+        except queue.Full:
+            with self.__lock:
+                self.rejected += 1
+            raise SSHException(
+                f'{self.max_pending} commands are already pending, '
+                f'none finished within {self.submit_timeout}s.'
+            ) from None
+        with self.__lock:
+            self.submitted += 1
+            if not self.__idle.acquire(blocking=False) \
+                    and len(self.__threads) < self.max_workers:
+                # Daemon threads, as `cmd_async` always used, a command
+                # left running does not hold the interpreter at exit.
+                thread = threading.Thread(
+                    target=self.__work, name='SSHCommand', daemon=True
+                )
+                self.__threads.add(thread)
+                thread.start()
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self.__lock:
+            self.__shutdown = True
+            threads: list = list(self.__threads)
+        if cancel_futures:
+            while True:
+                try:
+                    future, *_ = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                future.cancel()
+        # One stop mark for each worker after the pending commands, added
+        # past `max_pending` so that a full queue does not block here.
+        with self.__queue.mutex:
+            self.__queue.queue.extend([None] * len(threads))
+            self.__queue.not_empty.notify_all()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __work(self):
+        while True:
+            item: tuple = self.__queue.get()
+            if item is None:
+                break
+            future, fn, a, kw = item
+            del item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*a, **kw))
+                except BaseException as e:
+                    future.set_exception(e)
+                with self.__lock:
+                    self.completed += 1
+            del future, fn, a, kw
+            self.__idle.release()
+        with self.__lock:
+            self.__threads.discard(threading.current_thread())
+
+
+CommandExecutor.default = CommandExecutor()
+
+
+class Deadline:
+
+    def __init__(self, seconds: float = None, *, signal: str = None):
+        if seconds is not None and seconds.__class__ not in (int, float):
+            x: str = seconds.__class__.__name__
+            raise TypeError(
+                'parameter "seconds" type must '
+                f'be a "int" or "float", not "{x}".'
+            )
+        if signal is not None and signal.__class__ is not str:
+            x: str = signal.__class__.__name__
+            raise TypeError(
+                f'parameter "signal" type must be a "str", not "{x}".'
+            )
+        if signal is not None:
+            signal: str = signal.upper()
+            if signal.startswith('SIG'):
+                signal = signal[3:]
+        self.seconds   = seconds
+        self.signal    = signal
+        self.expires   = None if seconds is None \
+            else time.monotonic() + seconds
+        self.cancelled = False
+
+        self.__channels = set()
+        self.__lock     = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'<Deadline {self.seconds}s remaining={self.remaining()}>'
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or self.remaining() == 0
+
+    def remaining(self, timeout: float = None) -> float:
+        # The seconds left, capped by `timeout`, None if both are unlimited.
+        if self.expires is None:
+            return timeout
+        left: float = max(self.expires - time.monotonic(), 0)
+        return left if timeout is None else min(left, timeout)
+
+    def check(self):
+        if self.expires is not None and time.monotonic() >= self.expires:
+            raise socket.timeout(f'deadline of {self.seconds}s exceeded.')
+        if self.cancelled:
+            raise CancelledError
+
+    def cancel(self):
+        with self.__lock:
+            self.cancelled = True
+            channels: list = list(self.__channels)
+        for channel in channels:
+            self.abort(channel)
+
+    def abort(self, channel: Channel):
+        # Ask sshd to signal the remote process (RFC 4254 section 6.9, not
+        # all servers honour it), then close the channel, a reader blocked
+        # on it returns at once.
+        if self.signal is not None and not channel.closed:
+            m = Message()
+            m.add_byte(cMSG_CHANNEL_REQUEST)
+            m.add_int(channel.remote_chanid)
+            m.add_string('signal')
+            m.add_boolean(False)
+            m.add_string(self.signal)
+            try:
+                channel.transport._send_user_message(m)
+            except (SSHException, OSError):
+                pass
+        channel.close()
+
+    def _attach(self, channel: Channel):
+        with self.__lock:
+            if not self.cancelled:
+                self.__channels.add(channel)
+                return
+        self.abort(channel)
+
+    def _detach(self, channel: Channel):
+        with self.__lock:
+            self.__channels.discard(channel)
+
+    @classmethod
+    def _get(cls, deadline) -> 'Deadline':
+        # The `deadline` parameter, seconds or a shared instance.
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        if deadline.__class__ not in (int, float):
+            x: str = deadline.__class__.__name__
+            raise TypeError(
+                'parameter "deadline" type must be a '
+                f'"int", "float" or Deadline instance, not "{x}".'
+            )
+        return cls(deadline)
+
+
+class Profile:
+
+    def __init__(
+            self,
+            name:            str,
+            *,
+            ciphers:         tuple = (),
+            macs:            tuple = (),
+            kex:             tuple = (),
+            window_size:     int   = DEFAULT_WINDOW_SIZE,
+            max_packet_size: int   = DEFAULT_MAX_PACKET_SIZE,
+            read_size:       int   = 32768
+    ):
+        if name.__class__ is not str:
+            x: str = name.__class__.__name__
+            raise TypeError(
+                f'parameter "name" type must be a "str", not "{x}".'
+            )
+        for x, value in ('ciphers', ciphers), ('macs', macs), ('kex', kex):
+            if value.__class__ not in (tuple, list) or any(
+                    v.__class__ is not str for v in value
+            ):
+                raise TypeError(
+                    f'parameter "{x}" must be a tuple of "str", '
+                    f'not {value!r}.'
+                )
+        for x, value in (
+                ('window_size', window_size),
+                ('max_packet_size', max_packet_size),
+                ('read_size', read_size)
+        ):
+            if value.__class__ is not int or value <= 0:
+                raise ValueError(
+                    f'parameter "{x}" must be a positive int, not {value!r}.'
+                )
+        self.name            = name
+        self.ciphers         = tuple(ciphers)
+        self.macs            = tuple(macs)
+        self.kex             = tuple(kex)
+        self.window_size     = window_size
+        self.max_packet_size = max_packet_size
+        self.read_size       = read_size
+
+    def __repr__(self) -> str:
+        return f'<Profile {self.name!r}>'
+
+    @classmethod
+    def _get(cls, profile) -> 'Profile':
+        # The `profile` parameter, a name in `Profile.profiles` or an instance.
+        if profile is None or isinstance(profile, Profile):
+            return profile
+        if profile.__class__ is not str:
+            x: str = profile.__class__.__name__
+            raise TypeError(
+                'parameter "profile" type must be a '
+                f'"str" or Profile instance, not "{x}".'
+            )
+        try:
+            return cls.profiles[profile]
+        except KeyError:
+            raise ValueError(
+                f'unknown profile {profile!r}, '
+                f'choose from {", ".join(cls.profiles)}.'
+            ) from None
+
+    def _transport(self, sock, **kw) -> '_Transport':
+        # Used as the `transport_factory` of `SSHClient.connect`, so the
+        # preferences are set before the key exchange starts. The preferred
+        # algorithms go first, the other ones supported by paramiko (and not
+        # disabled) stay behind them, a server without any of the preferred
+        # ones can still be connected.
+        transport = _Transport(
+            sock,
+            default_window_size    =self.window_size,
+            default_max_packet_size=self.max_packet_size,
+            **kw
+        )
+        options: paramiko.SecurityOptions = transport.get_security_options()
+        for x, preferred in (
+                ('ciphers', self.ciphers),
+                ('digests', self.macs),
+                ('kex', self.kex)
+        ):
+            supported: tuple = getattr(options, x)
+            setattr(options, x, tuple(
+                p for p in preferred if p in supported
+            ) + tuple(
+                s for s in supported if s not in preferred
+            ))
+        transport.read_size = self.read_size
+        return transport
+
+
+# AES-GCM needs no separate MAC, it is the fastest cipher of paramiko (by
+# half over AES-CTR with HMAC-SHA2-256), and the "etm" MACs are only used
+# with CTR ciphers. Larger packets spread the per-packet cost of paramiko
+# over more bytes, a larger window keeps a long fat link busy. A smaller
+# window and packets keep less bulk data queued ahead of the small replies
+# sharing the connection.
+Profile.profiles = {
+    'throughput': Profile(
+        'throughput',
+        ciphers=(
+            'aes128-gcm@openssh.com', 'aes256-gcm@openssh.com',
+            'aes128-ctr', 'aes256-ctr'
+        ),
+        macs=(
+            'hmac-sha2-256-etm@openssh.com', 'hmac-sha2-256'
+        ),
+        kex=(
+            'curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256'
+        ),
+        window_size    =16 << 20,
+        max_packet_size=1 << 17,
+        read_size      =1 << 20
+    ),
+    'low-latency': Profile(
+        'low-latency',
+        ciphers=(
+            'aes128-gcm@openssh.com', 'aes128-ctr'
+        ),
+        macs=(
+            'hmac-sha2-256-etm@openssh.com', 'hmac-sha2-256'
+        ),
+        kex=(
+            'curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256'
+        ),
+        window_size    =512 << 10,
+        max_packet_size=16 << 10,
+        read_size      =16 << 10
+    )
+}
+
+
 class GqylpySSH(SSHClient):
 
     def __init__(self, hostname: str, port: int = 22, **params):
+        self._setup(hostname, port, **params)
+        if not self.lazy:
+            self._connect()
+        if self.keepalive is not None:
+            self.supervisor.register(self)
+
+    def _setup(self, hostname: str, port: int, **params):
         SSHClient.__init__(self)
         self.set_missing_host_key_policy(AutoAddPolicy())
 
         key_filename: str = params.get('key_filename')
         key_password: str = params.pop('key_password', None)
+        pkey: paramiko.PKey = params.get('pkey')
 
-        if key_filename is not None and key_password is not None:
-            pkey = paramiko.RSAKey.from_private_key_file(
-                key_filename, key_password)
-            del params['key_filename']
-        else:
-            pkey = None
+        if key_filename.__class__ is str:
+            try:
+                pkey = _load_pkey(
+                    key_filename, key_password or params.get('passphrase')
+                )
+                del params['key_filename']
+            except (SSHException, OSError):
+                # Without a password, let paramiko try the key and the
+                # other authentication methods as it used to.
+                if key_password is not None:
+                    raise
 
         self.command_timeout: int  = params.pop('command_timeout', None)
         self.auto_sudo:       bool = params.pop('auto_sudo', False)
         self.reconnect:       bool = params.pop('reconnect', False)
+        self.sentinel:        bool = params.pop('sentinel', False)
+        self.max_sessions:    int  = params.pop('max_sessions', 10)
+        self.max_memory:      int  = params.pop('max_memory', None)
+        self.encoding:        str  = params.pop('encoding', 'utf-8')
+        self.encoding_errors: str  = params.pop('encoding_errors', 'strict')
+        self.lazy:            bool = params.pop('lazy', False)
+        self.keepalive:       float = params.pop('keepalive', None)
+        self.supervisor: Supervisor = params.pop('supervisor', None)
+
+        if self.keepalive is not None and self.supervisor is None:
+            self.supervisor = Supervisor.default
+
+        self.reconnects: int   = 0
+        self.downtime:   float = 0
+        self.down_since: float = None
+        self.last_error: Exception = None
+        self.__failures: int = 0
+        self.__compressors: set = None
+        self.pool: ConnectionPool  = params.pop('pool', None)
+
+        if self.pool is True:
+            self.pool = ConnectionPool.default
+        elif self.pool is False:
+            self.pool = None
+        elif self.pool is not None and not isinstance(
+                self.pool, ConnectionPool
+        ):
+            x: str = self.pool.__class__.__name__
+            raise TypeError(
+                'parameter "pool" type must be a '
+                f'bool or ConnectionPool instance, not "{x}".'
+            )
+        if self.pool is not None and params.get('sock') is not None:
+            raise ValueError(
+                'parameter "pool" cannot be used with parameter "sock".'
+            )
+
+        jump = params.pop('jump', None)
+
+        if jump is not None and params.get('sock') is not None:
+            raise ValueError(
+                'parameter "jump" cannot be used with parameter "sock".'
+            )
+
+        self.metrics: Metrics = params.pop('metrics', None)
+
+        if self.metrics is True:
+            self.metrics = Metrics.default
+        elif self.metrics is False:
+            self.metrics = None
+        elif self.metrics is not None and not isinstance(
+                self.metrics, Metrics
+        ):
+            x: str = self.metrics.__class__.__name__
+            raise TypeError(
+                'parameter "metrics" type must be a '
+                f'bool or Metrics instance, not "{x}".'
+            )
+
+        self.executor: Executor = params.pop('executor', None)
+
+        if self.executor is None:
+            self.executor = CommandExecutor.default
+        elif not isinstance(self.executor, Executor):
+            x: str = self.executor.__class__.__name__
+            raise TypeError(
+                'parameter "executor" type must be a '
+                f'concurrent.futures.Executor instance, not "{x}".'
+            )
 
-        self.connect(hostname, port, **params, pkey=pkey)
+        self.cache: ResultCache = params.pop('cache', None)
+
+        if self.cache is None or self.cache is True:
+            self.cache = ResultCache.default
+        elif self.cache is False:
+            self.cache = None
+        elif not isinstance(self.cache, ResultCache):
+            x: str = self.cache.__class__.__name__
+            raise TypeError(
+                'parameter "cache" type must be a '
+                f'bool or ResultCache instance, not "{x}".'
+            )
+
+        self.profile: Profile = Profile._get(params.pop('profile', None))
+
+        if self.profile is not None:
+            if params.get('transport_factory') is not None:
+                raise ValueError(
+                    'parameter "profile" cannot be used with '
+                    'parameter "transport_factory".'
+                )
+            params['transport_factory'] = self.profile._transport
 
         params['pkey'] = pkey
+        params.setdefault('transport_factory', _Transport)
         self.hostname  = hostname
+        self.port      = port
         self.params    = params
+        self.jump: GqylpySSH = jump and _jump_host(jump, params)
+
+        self.__connect_lock = threading.Lock()
+
+    def _connect(self):
+        # `connect` sets `self._transport` before the handshake, a failed
+        # connect must not leave it on the instance: the next `_connect` or
+        # `close` would hand it back to the pool, which already released it.
+        if self.pool is not None and self._transport is not None:
+            self.pool.discard(self.__pool_key, self._transport)
+            self._transport = None
+        try:
+            if self.pool is None:
+                self.__handshake()
+            else:
+                self._transport = self.pool.checkout(
+                    self.__pool_key, self.__handshake
+                )
+        except BaseException:
+            transport: Transport = self._transport
+            self._transport = None
+            if transport is not None:
+                transport.close()
+            raise
+
+    def __handshake(self) -> Transport:
+        params: dict = self.params
+        if self.jump is not None:
+            params = {**params, 'sock': self.__jump_channel()}
+        self.connect(self.hostname, self.port, **params)
+        sock = self._transport.sock
+        if isinstance(sock, socket.socket):
+            # Channel requests are small packets sent back to back, do not
+            # let Nagle's algorithm hold them for the peer's delayed ACK.
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self._transport
+
+    def __jump_channel(self) -> Channel:
+        # The target is reached through a "direct-tcpip" channel of the jump
+        # host's connection, which many targets share. The jump host is
+        # reconnected first if its connection is gone.
+        jump: GqylpySSH = self.jump
+        transport: Transport = jump.get_transport()
+        if transport is None or not transport.is_authenticated():
+            with jump.__connect_lock:
+                transport: Transport = jump._transport
+                if transport is None or not transport.is_authenticated():
+                    jump._connect()
+                    transport: Transport = jump._transport
+        return transport.open_channel(
+            'direct-tcpip',
+            dest_addr=(self.hostname, self.port),
+            src_addr =('127.0.0.1', 0),
+            timeout  =self.params.get('timeout')
+        )
+
+    @property
+    def __pool_key(self) -> tuple:
+        params: dict = self.params
+        pkey: paramiko.PKey = params.get('pkey')
+        auth: bytes = repr((
+            params.get('password'),
+            params.get('key_filename'),
+            params.get('passphrase'),
+            pkey and pkey.get_fingerprint()
+        )).encode()
+        key: tuple = (
+            self.hostname,
+            self.port,
+            params.get('username'),
+            hashlib.sha256(auth).hexdigest(),
+            self.profile
+        )
+        if self.jump is not None:
+            key += self.jump.__pool_key
+        return key
+
+    @property
+    def state(self) -> str:
+        if self.down_since is not None:
+            return 'reconnecting'
+        transport: Transport = self._transport
+        if transport is not None and transport.is_active():
+            return 'connected'
+        return 'disconnected'
+
+    def _heal(self, supervisor: 'Supervisor') -> int:
+        # Called by the supervisor every `keepalive` seconds, a transport that
+        # does not answer the keepalive in time is closed, this is how a
+        # half-open connection is detected, and replaced. Return the number
+        # of consecutive failed reconnects.
+        transport: Transport = self._transport
+        if transport is None and self.down_since is None:
+            # Not connected yet (lazy) or closed by the user.
+            return 0
+        if transport is not None and transport.is_active():
+            ok: bool = _ping(transport, supervisor.ping_timeout)
+            supervisor.pinged(ok)
+            if ok:
+                return 0
+
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        with self.__connect_lock:
+            try:
+                self._connect()
+            except Exception as e:
+                self.last_error = e
+                self.__failures += 1
+                return self.__failures
+
+        self.reconnects += 1
+        self.downtime += time.monotonic() - self.down_since
+        if self.metrics is not None:
+            self.metrics.reconnected(self.hostname, self.port)
+        self.down_since = None
+        self.__failures = 0
+        return 0
+
+    def __connect_if_lazy(self):
+        # `connect` sets `self._transport` before the handshake, a thread
+        # coming meanwhile waits for the lock until it is authenticated. A
+        # failed connect leaves no transport, the next use tries again.
+        transport: Transport = self._transport
+        if self.lazy and (
+                transport is None or not transport.is_authenticated()
+        ):
+            with self.__connect_lock:
+                transport: Transport = self._transport
+                if transport is None or not transport.is_authenticated():
+                    self._connect()
+
+    def get_transport(self) -> Transport:
+        self.__connect_if_lazy()
+        return SSHClient.get_transport(self)
+
+    def exec_command(self, *a, **kw) -> tuple:
+        self.__connect_if_lazy()
+        return SSHClient.exec_command(self, *a, **kw)
+
+    def invoke_shell(self, *a, **kw) -> Channel:
+        self.__connect_if_lazy()
+        return SSHClient.invoke_shell(self, *a, **kw)
+
+    def open_sftp(self) -> paramiko.SFTPClient:
+        self.__connect_if_lazy()
+        return SSHClient.open_sftp(self)
+
+    def close(self):
+        self.keepalive  = None
+        self.down_since = None
+        if self.pool is not None and self._transport is not None:
+            self.pool.checkin(self.__pool_key, self._transport)
+            self._transport = None
+        SSHClient.close(self)
 
     def __del__(self):
         try:
@@ -95,11 +1444,273 @@ class GqylpySSH(SSHClient):
             self,
             command: str,
             *,
-            timeout: int  = None,
-            bufsize: int  = -1,
-            get_pty: bool = False,
-            env:     dict = None
+            timeout: int   = None,
+            bufsize: int   = -1,
+            get_pty: bool  = False,
+            env:     dict  = None,
+            ttl:     float = None,
+            stdin          = None,
+            compress       = None,
+            deadline       = None
     ) -> 'Command':
+        self._check(command, timeout, bufsize, env)
+        deadline: Deadline = Deadline._get(deadline)
+
+        if ttl is not None and ttl.__class__ not in (int, float):
+            x: str = ttl.__class__.__name__
+            raise TypeError(
+                f'parameter "ttl" type must be a "int" or "float", not "{x}".'
+            )
+        if stdin is not None and not (
+                stdin.__class__ in (bytes, bytearray, memoryview, str)
+                or hasattr(stdin, 'read') or hasattr(stdin, '__iter__')
+        ):
+            x: str = stdin.__class__.__name__
+            raise TypeError(
+                'parameter "stdin" type must be a "bytes", '
+                f'file or iterator, not "{x}".'
+            )
+
+        command: str = command.strip()
+
+        if command[-1] == '&':
+            return self.cmd_async(
+                command=command,
+                timeout=timeout,
+                bufsize=bufsize,
+                get_pty=get_pty,
+                env=env,
+                stdin=stdin,
+                compress=compress,
+                deadline=deadline
+            )
+
+        command: str = self._prepare(command)
+
+        if ttl is not None and self.cache is not None and stdin is None:
+            key = (
+                self.hostname,
+                self.port,
+                self.params.get('username'),
+                command,
+                env and tuple(sorted(env.items())),
+                get_pty
+            )
+            # Compressed or not, the result is the same.
+            co: Command = self.cache.get(key)
+            if co is not None:
+                return co
+        else:
+            key = None
+
+        program: str = self.__compressor(compress, get_pty, timeout)
+
+        if self.metrics is None:
+            co: Command = self.__run(
+                command, timeout, bufsize, get_pty, env, stdin, program,
+                deadline
+            )
+        else:
+            with self.metrics.span(self, command) as span:
+                co: Command = self.__run(
+                    command, timeout, bufsize, get_pty, env, stdin, program,
+                    deadline, span
+                )
+
+        if key is not None and co.status:
+            self.cache.put(key, co, ttl)
+
+        return co
+
+    def __run(
+            self,
+            command: str,
+            timeout: int,
+            bufsize: int,
+            get_pty: bool,
+            env:     dict,
+            stdin,
+            program:  str        = None,
+            deadline: 'Deadline' = None,
+            span:     'Span'     = None
+    ) -> 'Command':
+        execute: str = command + ' && echo 4289077' \
+            if self.sentinel else command
+        if program is not None:
+            execute: str = _compressed(execute, _COMPRESSORS[program][0])
+            decompressor = _COMPRESSORS[program][1]()
+        else:
+            decompressor = None
+        # The stdin file is kept referenced, when it is collected it sends
+        # EOF, the remote process would not get the input.
+        writer, stdout, _ = self._exec(
+            execute, timeout, bufsize, get_pty, env, span, deadline
+        )
+        channel: Channel = stdout.channel
+        if stdin is not None:
+            feeder: threading.Thread = _feed(channel, stdin, self.encoding)
+        try:
+            out, err, found = _spool(
+                channel, self.max_memory, span, deadline, decompressor,
+                self.sentinel
+            )
+            if deadline is not None:
+                # Also raised if cancelled, the channel was closed.
+                deadline.check()
+            exit_status: int = channel.recv_exit_status()
+        except BaseException:
+            if deadline is not None:
+                deadline.abort(channel)
+            raise
+        finally:
+            if deadline is not None:
+                deadline._detach(channel)
+            if stdin is not None:
+                if feeder.is_alive():
+                    # The output ended abnormally (e.g. timed out), unblock
+                    # the feeder waiting for the remote window.
+                    channel.close()
+                feeder.join()
+                if span is not None:
+                    span.bytes_out += feeder.sent
+        if stdin is not None and feeder.error is not None:
+            raise feeder.error
+        if span is not None:
+            span.exit_status = exit_status
+
+        co = Command(
+            command, out, err,
+            exit_status=exit_status,
+            exit_signal=getattr(channel, 'exit_signal', None),
+            encoding   =self.encoding,
+            errors     =self.encoding_errors
+        )
+        if self.sentinel:
+            # The spool dropped the sentinel line, without loading a spilled
+            # output into memory.
+            co.status = found
+        return co
+
+    def __compressor(self, compress, get_pty: bool, timeout: int) -> str:
+        # The name of the program the output is piped through, the one asked
+        # for first, or None to fall back to the plain output: none of them
+        # on the remote host (probed once) or locally, or a pseudo-terminal,
+        # which would mangle the binary output.
+        if compress is None or compress is False:
+            return None
+        if compress is not True and compress not in _COMPRESSORS:
+            raise ValueError(
+                'parameter "compress" must be a bool, '
+                f'"zstd" or "gzip", not {compress!r}.'
+            )
+        if get_pty:
+            return None
+        if self.__compressors is None:
+            _, stdout, _ = self._exec(
+                'for c in zstd gzip; do command -v $c; done',
+                timeout, -1, False, None
+            )
+            try:
+                self.__compressors = {
+                    posixpath.basename(x)
+                    for x in stdout.read().decode(errors='replace').split()
+                }
+            finally:
+                stdout.channel.close()
+        for name in _COMPRESSORS if compress is True else (compress,):
+            if name in self.__compressors \
+                    and (name != 'zstd' or zstandard is not None):
+                return name
+        return None
+
+    def stream(
+            self,
+            command:  str,
+            *,
+            timeout:  int  = None,
+            bufsize:  int  = -1,
+            get_pty:  bool = False,
+            env:      dict = None,
+            compress        = None
+    ) -> 'CommandStream':
+        self._check(command, timeout, bufsize, env)
+
+        command: str = self._prepare(command.strip())
+        program: str = self.__compressor(compress, get_pty, timeout)
+        _, stdout, _ = self._exec(
+            command if program is None
+            else _compressed(command, _COMPRESSORS[program][0]),
+            timeout, bufsize, get_pty, env
+        )
+
+        return CommandStream(
+            command, stdout.channel,
+            encoding    =self.encoding,
+            errors      =self.encoding_errors,
+            decompressor=program and _COMPRESSORS[program][1]()
+        )
+
+    def _exec(
+            self,
+            command: str,
+            timeout: int,
+            bufsize: int,
+            get_pty: bool,
+            env:     dict,
+            span:     'Span'     = None,
+            deadline: 'Deadline' = None
+    ) -> tuple:
+        timeout = timeout or self.command_timeout
+        if deadline is not None:
+            # The channel open and each read wait no longer than what is
+            # left, the reads raise `socket.timeout` once it is reached.
+            deadline.check()
+            timeout = deadline.remaining(timeout)
+        if self.down_since is not None:
+            # Fail fast instead of waiting on a dead socket, the supervisor
+            # is reconnecting in the background.
+            raise SSHException(
+                f'connection to {self.hostname}:{self.port} is down for '
+                f'{time.monotonic() - self.down_since:.1f}s, reconnecting: '
+                f'{self.last_error!r}'
+            )
+        if span is not None and self.lazy and self._transport is None:
+            self.__connect_if_lazy()
+            span.mark('connect')
+        try:
+            result: tuple = self.exec_command(
+                command=command,
+                timeout=timeout,
+                bufsize=bufsize,
+                get_pty=get_pty,
+                environment=env
+            )
+        except (SSHException, ConnectionResetError) as e:
+            if not self.reconnect:
+                raise e
+            try:
+                self._connect()
+            except (TimeoutError, NoValidConnectionsError):
+                raise e
+            if span is not None:
+                # The failed attempt is counted in the connect time.
+                span.reconnects += 1
+                span.mark('connect')
+            result: tuple = self.exec_command(
+                command=command,
+                timeout=timeout,
+                bufsize=bufsize,
+                get_pty=get_pty,
+                environment=env
+            )
+        if span is not None:
+            span.mark('channel_open')
+        if deadline is not None:
+            deadline._attach(result[1].channel)
+        return result
+
+    @staticmethod
+    def _check(command: str, timeout: int, bufsize: int, env: dict):
         if command.__class__ is not str:
             x: str = command.__class__.__name__
             raise TypeError(
@@ -123,66 +1734,724 @@ class GqylpySSH(SSHClient):
                 f'parameter "env" type must be a "dict", not "{x}".'
             )
 
+    def _prepare(self, command: str) -> str:
+        if self.auto_sudo and not (
+                self.params.get('username') == 'root'
+                or command.startswith('sudo ')
+        ):
+            command = f'sudo {command}'
+        return command
+
+    def shell(self, *, timeout: int = None, env: dict = None) -> 'ShellSession':
+        return ShellSession(self, timeout=timeout, env=env)
+
+    def cmd_many(
+            self,
+            commands: (tuple, list),
+            *,
+            batch:    bool = False,
+            deadline       = None,
+            **kw
+    ):
+        if commands.__class__ not in (tuple, list):
+            raise TypeError(
+                'Parameter "commands" type must be a list or tuple. '
+                'If list, execute command in order and return result list; '
+                'If tuple, same as above, but next command is execute only '
+                'when previous command is successfully executed.'
+            )
+        # One deadline for all the commands, those finished are yielded
+        # before the timeout is raised.
+        kw['deadline'] = Deadline._get(deadline)
+        tuple_mode: bool = commands.__class__ is tuple
+        if tuple_mode or batch:
+            commands = list(map(self.__strip_async, commands))
+        if batch and self.metrics is not None:
+            # One span for the script, from sending it to the last result.
+            with self.metrics.span(
+                    self, '\n'.join(commands), kind='cmd_many'
+            ) as span:
+                yield from self.__cmd_batch(
+                    commands, tuple_mode, span=span, **kw
+                )
+        elif batch:
+            yield from self.__cmd_batch(commands, tuple_mode, **kw)
+        elif tuple_mode:
+            for c in commands:
+                co: Command = self.cmd(c, **kw)
+                co.raise_if_error()
+                yield co
+        else:
+            yield from (self.cmd(c, **kw) for c in commands)
+
+    @staticmethod
+    def __strip_async(command: str) -> str:
+        command: str = command.rstrip()
+        if command[-1] == '&':
+            command = command[:-1]
+            warnings.warn(
+                'note that running multiple commands in tuple '
+                'or batch mode cannot use asynchrony "&".'
+            , stacklevel=3)
+        return command
+
+    def __cmd_batch(
+            self,
+            commands:   list,
+            tuple_mode: bool,
+            *,
+            timeout:    int        = None,
+            bufsize:    int        = -1,
+            get_pty:    bool       = False,
+            env:        dict       = None,
+            ttl:        float      = None,
+            stdin                  = None,
+            compress               = None,
+            deadline:   'Deadline' = None,
+            span:       'Span'     = None
+    ):
+        # All commands are sent as one script, each runs in a subshell and is
+        # followed by a frame line carrying its exit status on stdout and a
+        # frame line on stderr, the output is split back by the frames.
+        if get_pty:
+            raise ValueError('batch mode cannot use pseudo-terminal.')
+        if ttl is not None:
+            raise ValueError('batch mode cannot use the result cache "ttl".')
+        if stdin is not None:
+            raise ValueError('batch mode cannot use "stdin".')
+        for c in commands:
+            self._check(c, timeout, bufsize, env)
+
+        commands = [self._prepare(c.strip()) for c in commands]
+        marker = f'GQYLPY-BATCH-{uuid.uuid4().hex}'
+        script = [f'M={marker}']
+        for c in commands:
+            script.append(
+                f'( {c}\n) </dev/null; s=$?; '
+                'printf "\\n%s %d\\n" $M $s; printf "\\n%s\\n" $M >&2'
+            )
+            if tuple_mode:
+                script.append('[ $s -eq 0 ] || exit $s')
+
+        script: str = '\n'.join(script)
+        program: str = self.__compressor(compress, get_pty, timeout)
+        if program is not None:
+            script: str = _compressed(script, _COMPRESSORS[program][0])
+
+        _, stdout, _ = self._exec(
+            script, timeout, bufsize, get_pty, env, span, deadline
+        )
+        channel: Channel = stdout.channel
+        chunks = _drain(channel, deadline=deadline)
+        if span is not None:
+            chunks = span.received(chunks)
+        if program is not None:
+            chunks = _decompress(chunks, _COMPRESSORS[program][1]())
+
+        out_mark: bytes = f'\n{marker} '.encode()
+        err_mark: bytes = f'\n{marker}\n'.encode()
+        out, err = bytearray(), bytearray()
+        out_frames, err_frames = [], []
+        # Where the next marker may start, a marker whose status line is
+        # not complete yet is searched again from its start.
+        out_scan = err_scan = 0
+
+        try:
+            for fd, chunk in chunks:
+                if fd == 1:
+                    out += chunk
+                    while True:
+                        i: int = out.find(out_mark, out_scan)
+                        if i == -1:
+                            out_scan = max(len(out) - len(out_mark) + 1, 0)
+                            break
+                        j: int = out.find(b'\n', i + len(out_mark))
+                        if j == -1:
+                            out_scan = i
+                            break
+                        out_frames.append((
+                            bytes(out[:i]), int(out[i + len(out_mark):j])
+                        ))
+                        del out[:j + 1]
+                        out_scan = 0
+                else:
+                    err += chunk
+                    while True:
+                        i: int = err.find(err_mark, err_scan)
+                        if i == -1:
+                            err_scan = max(len(err) - len(err_mark) + 1, 0)
+                            break
+                        err_frames.append(bytes(err[:i]))
+                        del err[:i + len(err_mark)]
+                        err_scan = 0
+                while out_frames and err_frames:
+                    yield self.__batch_result(
+                        commands, out_frames, err_frames, tuple_mode
+                    )
+            if deadline is not None:
+                deadline.check()
+            exit_status: int = channel.recv_exit_status()
+            if span is not None:
+                span.exit_status = exit_status
+        except BaseException:
+            if deadline is not None:
+                deadline.abort(channel)
+            raise
+        finally:
+            if deadline is not None:
+                deadline._detach(channel)
+            channel.close()
+
+        while out_frames:
+            err_frames.append(b'')
+            yield self.__batch_result(
+                commands, out_frames, err_frames, tuple_mode
+            )
+        if commands:
+            raise SSHException(
+                f'batch interrupted before ({commands[0]}), '
+                f'exit status {channel.exit_status}: '
+                f'{bytes(out + err).decode(errors="replace")}'
+            )
+
+    def __batch_result(
+            self,
+            commands:   list,
+            out_frames: list,
+            err_frames: list,
+            tuple_mode: bool
+    ) -> 'Command':
+        stdout, exit_status = out_frames.pop(0)
+        co = Command(
+            commands.pop(0), stdout, err_frames.pop(0),
+            exit_status=exit_status,
+            encoding   =self.encoding,
+            errors     =self.encoding_errors
+        )
+        if tuple_mode:
+            co.raise_if_error()
+        return co
+
+    def cmd_mux(
+            self,
+            commands:     (tuple, list),
+            *,
+            max_sessions: int  = None,
+            timeout:      int  = None,
+            bufsize:      int  = -1,
+            get_pty:      bool = False,
+            env:          dict = None,
+            deadline            = None
+    ):
+        if commands.__class__ not in (tuple, list):
+            x: str = commands.__class__.__name__
+            raise TypeError(
+                'parameter "commands" type must '
+                f'be a "list" or "tuple", not "{x}".'
+            )
+        for c in commands:
+            self._check(c, timeout, bufsize, env)
+        deadline: Deadline = Deadline._get(deadline)
+
+        max_sessions: int = max_sessions or self.max_sessions
+        timeout = timeout or self.command_timeout
+        pending = iter(commands)
+        running = {}
+
+        try:
+            while True:
+                while len(running) < max_sessions:
+                    c: str = next(pending, None)
+                    if c is None:
+                        break
+                    c: str = self._prepare(c.strip())
+                    _, stdout, _ = self._exec(
+                        c + ' && echo 4289077' if self.sentinel else c,
+                        timeout, bufsize, get_pty, env, deadline=deadline
+                    )
+                    channel: Channel = stdout.channel
+                    # Output beyond `max_memory` spills to a file, as that
+                    # of `cmd` does.
+                    running[channel.fileno()] = (
+                        c, channel,
+                        _Spool(self.max_memory), _Spool(self.max_memory)
+                    )
+
+                if not running:
+                    break
+
+                try:
+                    readable: list = _readable(
+                        list(running), timeout if deadline is None
+                        else deadline.remaining(timeout)
+                    )
+                except (OSError, ValueError):
+                    # The pipe of a channel closed by `Deadline.cancel`.
+                    if deadline is not None:
+                        deadline.check()
+                    raise
+                if deadline is not None:
+                    # A channel closed by `Deadline.cancel` is readable.
+                    deadline.check()
+                if not readable:
+                    raise socket.timeout
+
+                for fd in readable:
+                    c, channel, out, err = running[fd]
+                    size: int = _read_size(channel)
+                    while channel.recv_ready():
+                        out.write(channel.recv(size))
+                    while channel.recv_stderr_ready():
+                        err.write(channel.recv_stderr(size))
+                    if not (channel.eof_received or channel.closed) \
+                            or channel.recv_ready() \
+                            or channel.recv_stderr_ready():
+                        continue
+                    del running[fd]
+                    if deadline is not None:
+                        deadline._detach(channel)
+                    channel.recv_exit_status()
+                    channel.close()
+                    found: bool = self.sentinel and out.strip(b'4289077\n')
+                    co = Command(
+                        c, out.getvalue(), err.getvalue(),
+                        exit_status=channel.exit_status,
+                        exit_signal=getattr(channel, 'exit_signal', None),
+                        encoding   =self.encoding,
+                        errors     =self.encoding_errors
+                    )
+                    if self.sentinel:
+                        co.status = found
+                    yield co
+        finally:
+            for _, channel, _, _ in running.values():
+                if deadline is None:
+                    channel.close()
+                else:
+                    deadline._detach(channel)
+                    deadline.abort(channel)
+
+    def cmd_async(self, command: str, **kw) -> Future:
+        command: str = command.rstrip()
+
+        if command[-1] == '&':
+            command: str = command[:-1]
+
+        # The deadline starts now, the time the command waits in the queue
+        # counts.
+        if 'deadline' in kw:
+            kw['deadline'] = Deadline._get(kw['deadline'])
+
+        return self.executor.submit(self.cmd, command, **kw)
+
+    def put(
+            self,
+            local:      str,
+            remote:     str,
+            *,
+            workers:    int  = 4,
+            chunk_size: int  = 8 << 20,
+            resume:     bool = False,
+            callback          = None
+    ) -> int:
+        size: int = os.path.getsize(local)
+        with self.open_sftp() as sftp:
+            offset: int = 0
+            if resume:
+                try:
+                    offset = sftp.stat(remote).st_size
+                except FileNotFoundError:
+                    pass
+                offset = _resume_offset(offset, size, workers, chunk_size)
+            if not offset:
+                sftp.open(remote, 'wb').close()
+
+            def send(sftp: paramiko.SFTPClient, ranges, progress):
+                with open(local, 'rb') as fl, sftp.open(remote, 'r+b') as fr:
+                    fr.set_pipelined(True)
+                    for start, end in ranges:
+                        fl.seek(start)
+                        fr.seek(start)
+                        while start < end:
+                            data: bytes = fl.read(min(32768, end - start))
+                            fr.write(data)
+                            start += len(data)
+                            progress(len(data))
+
+            return self.__transfer(
+                sftp, send, offset, size, workers, chunk_size, callback
+            )
+
+    def get(
+            self,
+            remote:     str,
+            local:      str,
+            *,
+            workers:    int  = 4,
+            chunk_size: int  = 8 << 20,
+            resume:     bool = False,
+            callback          = None
+    ) -> int:
+        with self.open_sftp() as sftp:
+            size: int = sftp.stat(remote).st_size
+            offset: int = 0
+            if resume and os.path.exists(local):
+                offset = _resume_offset(
+                    os.path.getsize(local), size, workers, chunk_size
+                )
+            if not offset:
+                open(local, 'wb').close()
+
+            def receive(sftp: paramiko.SFTPClient, ranges, progress):
+                with sftp.open(remote, 'rb') as fr, open(local, 'r+b') as fl:
+                    for start, end in ranges:
+                        fl.seek(start)
+                        for data in fr.readv([
+                            (i, min(32768, end - i))
+                            for i in range(start, end, 32768)
+                        ]):
+                            fl.write(data)
+                            progress(len(data))
+
+            return self.__transfer(
+                sftp, receive, offset, size, workers, chunk_size, callback
+            )
+
+    def sync(
+            self,
+            local_dir:  str,
+            remote_dir: str,
+            *,
+            delete:     bool = False,
+            dry_run:    bool = False,
+            workers:    int  = 4,
+            timeout:    int  = None
+    ) -> 'SyncReport':
+        report = SyncReport(local_dir, remote_dir, dry_run=dry_run)
+        clock: float = time.perf_counter()
+
+        def phase(name: str):
+            nonlocal clock
+            now: float = time.perf_counter()
+            report.timings[name] = now - clock
+            clock = now
+
+        local: dict = {}
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path: str = os.path.join(root, name)
+                st: os.stat_result = os.stat(path)
+                relpath: str = os.path.relpath(path, local_dir)
+                local[relpath.replace(os.sep, '/')] = \
+                    path, st.st_size, stat.S_IMODE(st.st_mode)
+        phase('scan')
+
+        # One command lists the size and mode of every remote file, followed
+        # by their checksums, the records of `find` are NUL-terminated and an
+        # empty record separates the two parts.
+        co: Command = self.cmd('sh -c ' + shlex.quote(
+            f'cd -- {shlex.quote(remote_dir)} 2>/dev/null || exit 0; '
+            "find . -type f -printf '%s %m %P\\0'; printf '\\0'; "
+            'find . -type f -exec sha256sum -- {} +'
+        ), timeout=timeout)
+        co.raise_if_error()
+        remote: dict = _parse_listing(co.stdout[:])
+        phase('list')
+
+        for relpath, (path, size, mode) in local.items():
+            if relpath not in remote:
+                report.added.append(relpath)
+                report.bytes += size
+                continue
+            remote_size, remote_mode, remote_sha256 = remote[relpath]
+            if size != remote_size or _sha256(path) != remote_sha256:
+                report.changed.append(relpath)
+                report.bytes += size
+            elif mode != remote_mode:
+                report.chmoded.append(relpath)
+            else:
+                report.unchanged.append(relpath)
+        if delete:
+            report.deleted.extend(sorted(set(remote) - set(local)))
+        phase('compare')
+
+        if dry_run or not report:
+            return report
+
+        dirs = {
+            posixpath.join(remote_dir, posixpath.dirname(relpath))
+            for relpath in report.added
+        }
+        if dirs:
+            self.cmd(
+                'mkdir -p -- ' + ' '.join(map(shlex.quote, sorted(dirs))),
+                timeout=timeout
+            ).raise_if_error()
+
+        # Files are uploaded next to their target and renamed over it, so
+        # that a running binary or a half-written config is never seen.
+        def upload(relpath: str):
+            path, _, mode = local[relpath]
+            target: str = posixpath.join(remote_dir, relpath)
+            part: str = posixpath.join(
+                posixpath.dirname(target),
+                f'.{posixpath.basename(target)}.gqylpy-sync'
+            )
+            self.put(path, part, workers=1)
+            with self.open_sftp() as sftp:
+                sftp.chmod(part, mode)
+                sftp.posix_rename(part, target)
+
+        with ThreadPoolExecutor(workers) as executor:
+            for future in [
+                executor.submit(upload, relpath)
+                for relpath in report.added + report.changed
+            ]:
+                future.result()
+        if report.chmoded:
+            with self.open_sftp() as sftp:
+                for relpath in report.chmoded:
+                    sftp.chmod(
+                        posixpath.join(remote_dir, relpath), local[relpath][2]
+                    )
+        phase('transfer')
+
+        if report.deleted:
+            self.cmd('sh -c ' + shlex.quote(
+                f'cd -- {shlex.quote(remote_dir)} && rm -f -- ' +
+                ' '.join(map(shlex.quote, report.deleted))
+            ), timeout=timeout).raise_if_error()
+            phase('delete')
+
+        if self.cache is not None:
+            self.cache.invalidate(self.hostname)
+
+        return report
+
+    def __transfer(
+            self,
+            sftp:       paramiko.SFTPClient,
+            func,
+            offset:     int,
+            size:       int,
+            workers:    int,
+            chunk_size: int,
+            callback
+    ) -> int:
+        if workers.__class__ is not int or workers < 1:
+            raise ValueError(
+                f'parameter "workers" must be a positive int, not {workers!r}.'
+            )
+        if chunk_size.__class__ is not int or chunk_size < 32768:
+            raise ValueError(
+                'parameter "chunk_size" must be an int of at least 32768, '
+                f'not {chunk_size!r}.'
+            )
+        # The file is cut into chunks handed out in ascending order, each
+        # worker moves its chunks over its own SFTP channel with pipelined
+        # requests, so that the round trips of the channels overlap.
+        ranges = iter([
+            (start, min(start + chunk_size, size))
+            for start in range(offset, size, chunk_size)
+        ])
+        lock = threading.Lock()
+        done: int = 0
+
+        def progress(n: int):
+            nonlocal done
+            with lock:
+                done += n
+                if callback is not None:
+                    callback(offset + done, size)
+
+        def chunks():
+            while True:
+                with lock:
+                    chunk: tuple = next(ranges, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+        def work():
+            with self.open_sftp() as sftp:
+                func(sftp, chunks(), progress)
+
+        workers: int = min(workers, -(-(size - offset) // chunk_size))
+        if workers > 1:
+            with ThreadPoolExecutor(workers - 1) as executor:
+                futures = [executor.submit(work) for _ in range(workers - 1)]
+                try:
+                    func(sftp, chunks(), progress)
+                finally:
+                    for future in futures:
+                        future.result()
+        else:
+            func(sftp, chunks(), progress)
+        return done
+
+
+def _resume_offset(
+        partial: int, size: int, workers: int, chunk_size: int
+) -> int:
+    # Chunks are handed out in ascending order and each worker has at most
+    # one chunk in flight, so if the transfer was interrupted, all the data
+    # before the last `workers` chunks started is known to be written. One
+    # worker writes sequentially, its partial file is a prefix.
+    if partial > size:
+        return 0
+    if workers == 1 or not partial:
+        return partial
+    return max(0, (partial - 1) // chunk_size - workers + 1) * chunk_size
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _parse_listing(output: bytes) -> dict:
+    # b"<size> <mode> <path>\0...\0\0<sha256>  ./<path>\n...", `sha256sum`
+    # prefixes the line with a backslash if it escaped the path.
+    records: list = output.split(b'\0')
+    checksums: dict = {}
+    for line in records[-1].split(b'\n'):
+        if not line:
+            continue
+        escaped: bool = line[:1] == b'\\'
+        if escaped:
+            line = line[1:]
+        name: bytes = line[68:]
+        if escaped:
+            name = re.sub(
+                rb'\\([\\nr])',
+                lambda m: {b'n': b'\n', b'r': b'\r'}.get(m[1], m[1]),
+                name
+            )
+        checksums[name] = line[:64].decode()
+
+    listing: dict = {}
+    for record in itertools.takewhile(bool, records):
+        size, mode, name = record.split(b' ', 2)
+        listing[os.fsdecode(name)] = \
+            int(size), int(mode, 8), checksums.get(name)
+    return listing
+
+
+class SyncReport:
+
+    def __init__(self, local_dir: str, remote_dir: str, *, dry_run: bool):
+        self.local_dir  = local_dir
+        self.remote_dir = remote_dir
+        self.dry_run    = dry_run
+
+        self.added     = []
+        self.changed   = []
+        self.chmoded   = []
+        self.deleted   = []
+        self.unchanged = []
+        self.bytes     = 0
+        self.timings   = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.chmoded or self.deleted)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} {self.local_dir} -> '
+            f'{self.remote_dir}{" (dry run)" if self.dry_run else ""}: '
+            f'{len(self.added)} added, {len(self.changed)} changed, '
+            f'{len(self.chmoded)} chmoded, {len(self.deleted)} deleted, '
+            f'{len(self.unchanged)} unchanged, {self.bytes} bytes>'
+        )
+
+
+class AsyncGqylpySSH(GqylpySSH):
+
+    def __init__(self, hostname: str, port: int = 22, **params):
+        self._setup(hostname, port, **params)
+
+    async def __aenter__(self) -> 'AsyncGqylpySSH':
+        await self.aconnect()
+        return self
+
+    async def __aexit__(self, *a):
+        self.close()
+
+    async def aconnect(self):
+        await asyncio.get_event_loop().run_in_executor(None, self._connect)
+        if self.keepalive is not None:
+            self.supervisor.register(self)
+
+    async def acmd(
+            self,
+            command: str,
+            *,
+            timeout: int  = None,
+            bufsize: int  = -1,
+            get_pty: bool = False,
+            env:     dict = None
+    ) -> 'Command':
+        self._check(command, timeout, bufsize, env)
+
         command: str = command.strip()
 
         if command[-1] == '&':
-            return self.cmd_async(
-                command=command,
-                timeout=timeout,
-                bufsize=bufsize,
-                get_pty=get_pty,
-                env=env
-            )
-
-        if self.auto_sudo and not (
-                self.params['username'] == 'root' or command.startswith('sudo ')
-        ):
-            command = f'sudo {command}'
+            command: str = command[:-1]
 
-        command += ' && echo 4289077'
+        command: str = self._prepare(command)
+        execute: str = command + ' && echo 4289077' \
+            if self.sentinel else command
         timeout = timeout or self.command_timeout
+        loop = asyncio.get_event_loop()
+
+        if self.lazy and self._transport is None:
+            await self.aconnect()
 
         try:
-            _, stdout, stderr = self.exec_command(
-                command=command,
-                timeout=timeout,
-                bufsize=bufsize,
-                get_pty=get_pty,
-                environment=env
+            channel: Channel = await self.__open(
+                loop, execute, timeout, get_pty, env
             )
         except (SSHException, ConnectionResetError) as e:
             if not self.reconnect:
                 raise e
             try:
-                self.connect(self.hostname, **self.params)
+                await self.aconnect()
             except (TimeoutError, NoValidConnectionsError):
                 raise e
             else:
-                _, stdout, stderr = self.exec_command(
-                    command=command,
-                    timeout=timeout,
-                    bufsize=bufsize,
-                    get_pty=get_pty,
-                    environment=env
+                channel: Channel = await self.__open(
+                    loop, execute, timeout, get_pty, env
                 )
 
-        return Command(command[:-16], stdout, stderr)
+        try:
+            stdout, stderr = await self.__drain(loop, channel, timeout)
+            if not await channel.status_event.until_set(timeout):
+                raise socket.timeout
+        finally:
+            channel.close()
 
-    def cmd_many(self, commands: (tuple, list), **kw):
+        return Command(
+            command, stdout, stderr,
+            exit_status=channel.exit_status,
+            exit_signal=getattr(channel, 'exit_signal', None),
+            sentinel   =self.sentinel,
+            encoding   =self.encoding,
+            errors     =self.encoding_errors
+        )
+
+    async def acmd_many(self, commands: (tuple, list), **kw):
         if commands.__class__ is tuple:
             for c in commands:
-                c: str = c.rstrip()
-                if c[-1] == '&':
-                    c = c[:-1]
-                    warnings.warn(
-                        'note that running multiple commands '
-                        'in tuple mode cannot use asynchrony "&".'
-                    , stacklevel=2)
-                co: Command = self.cmd(c, **kw)
+                co: Command = await self.acmd(c, **kw)
                 co.raise_if_error()
                 yield co
         elif commands.__class__ is list:
-            yield from (self.cmd(c, **kw) for c in commands)
+            for c in commands:
+                yield await self.acmd(c, **kw)
         else:
             raise TypeError(
                 'Parameter "commands" type must be a list or tuple. '
@@ -191,51 +2460,226 @@ class GqylpySSH(SSHClient):
                 'when previous command is successfully executed.'
             )
 
-    def cmd_async(self, command: str, **kw) -> threading.Thread:
-        command: str = command.rstrip()
+    async def __open(
+            self,
+            loop,
+            command: str,
+            timeout: int,
+            get_pty: bool,
+            env:     dict
+    ) -> Channel:
+        # `Transport.open_session` and `Channel.exec_command` block a thread
+        # until the server answers, here the same messages are sent and the
+        # answers awaited on the loop, no thread is held per command. The
+        # events of the channel are `_LoopEvent`, the open answer sets the
+        # channel event too, so does the close of the transport.
+        transport: Transport = self._transport
+        if transport is None or not transport.is_active():
+            raise SSHException('SSH session not active')
+        with transport.lock:
+            window_size: int = transport._sanitize_window_size(None)
+            max_packet_size: int = transport._sanitize_packet_size(None)
+            chanid: int = transport._next_channel()
+            channel = Channel(chanid)
+            channel.event = _LoopEvent(loop)
+            channel.status_event = _LoopEvent(loop)
+            transport._channels.put(chanid, channel)
+            transport.channel_events[chanid] = channel.event
+            transport.channels_seen[chanid] = True
+            channel._set_transport(transport)
+            channel._set_window(window_size, max_packet_size)
+        m = Message()
+        m.add_byte(cMSG_CHANNEL_OPEN)
+        m.add_string('session')
+        m.add_int(chanid)
+        m.add_int(window_size)
+        m.add_int(max_packet_size)
+        transport._send_user_message(m)
+        if not await channel.event.until_set(
+                timeout or transport.channel_timeout
+        ):
+            raise SSHException('Timeout opening channel.')
+        if channel.closed or transport._channels.get(chanid) is None:
+            raise transport.get_exception() or \
+                SSHException('Unable to open channel.')
 
-        if command[-1] == '&':
-            command: str = command[:-1]
+        try:
+            if get_pty:
+                await self.__request(
+                    channel, timeout, 'pty-req', 'vt100', 80, 24, 0, 0, b''
+                )
+            if env:
+                channel.update_environment(env)
+            await self.__request(channel, timeout, 'exec', command)
+        except BaseException:
+            channel.close()
+            raise
+        return channel
 
-        thread = threading.Thread(
-            target=self.cmd,
-            kwargs={'command': command, **kw},
-            name  =f'AsyncSSHCommand({command})',
-            daemon=True
-        )
-        thread.start()
+    @staticmethod
+    async def __request(channel: Channel, timeout: int, kind: str, *fields):
+        # A channel request answered by the server, as `Channel.get_pty` and
+        # `Channel.exec_command` send it.
+        m = Message()
+        m.add_byte(cMSG_CHANNEL_REQUEST)
+        m.add_int(channel.remote_chanid)
+        m.add_string(kind)
+        m.add_boolean(True)
+        for x in fields:
+            if x.__class__ is int:
+                m.add_int(x)
+            else:
+                m.add_string(x)
+        channel._event_pending()
+        channel.transport._send_user_message(m)
+        if not await channel.event.until_set(timeout):
+            raise socket.timeout
+        if not channel.event_ready:
+            raise channel.transport.get_exception() or \
+                SSHException('Channel closed.')
+
+    @staticmethod
+    async def __drain(loop, channel: Channel, timeout: int) -> tuple:
+        stdout, stderr = [], []
+        readable = asyncio.Event()
+        fd: int = channel.fileno()
+        size: int = _read_size(channel)
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), timeout)
+                except asyncio.TimeoutError:
+                    raise socket.timeout from None
+                readable.clear()
+                while channel.recv_ready():
+                    stdout.append(channel.recv(size))
+                while channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(size))
+                if (channel.eof_received or channel.closed) and not (
+                        channel.recv_ready() or channel.recv_stderr_ready()
+                ):
+                    break
+        finally:
+            loop.remove_reader(fd)
+        return b''.join(stdout), b''.join(stderr)
+
+
+class _LoopEvent(threading.Event):
+    # A `threading.Event` that paramiko sets from its transport thread, and
+    # a coroutine of `loop` awaits without a thread blocked in `wait`.
+
+    def __init__(self, loop):
+        threading.Event.__init__(self)
+        self.__loop    = loop
+        self.__waiters = []
+
+    def set(self):
+        threading.Event.set(self)
+        try:
+            self.__loop.call_soon_threadsafe(self.__wake)
+        except RuntimeError:
+            pass  # The loop is closed, nobody awaits.
 
-        return thread
+    def __wake(self):
+        # paramiko may set an event twice, the late call must not wake the
+        # waiters of the next request once the event is cleared again.
+        if not self.is_set():
+            return
+        for waiter in self.__waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def until_set(self, timeout: float = None) -> bool:
+        # Return whether the event is set, False after `timeout` seconds.
+        # `set` wakes the waiters through the loop, after they are added.
+        if self.is_set():
+            return True
+        waiter = self.__loop.create_future()
+        self.__waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.__waiters.remove(waiter)
+        return self.is_set()
 
 
 class Command:
 
     def __init__(
             self,
-            command: str,
-            stdout:  ChannelFile,
-            stderr:  ChannelStderrFile
+            command:     str,
+            stdout:      (ChannelFile, bytes),
+            stderr:      (ChannelStderrFile, bytes),
+            *,
+            exit_status: int  = None,
+            exit_signal: str  = None,
+            sentinel:    bool = False,
+            max_memory:  int  = None,
+            encoding:    str  = 'utf-8',
+            errors:      str  = 'strict'
     ):
-        self.command = command
-        self.stdout: bytes = stdout.read()
-        self.stderr: bytes = stderr.read()
+        if isinstance(stdout, ChannelFile):
+            channel: Channel = stdout.channel
+            stdout, stderr, status = _spool(
+                channel, max_memory, sentinel=sentinel
+            )
+            exit_status: int = channel.recv_exit_status()
+            exit_signal: str = getattr(channel, 'exit_signal', None)
+        elif sentinel:
+            status: bool = stdout[-8:] == b'4289077\n'
+            if status:
+                stdout = stdout[:-8]
+
+        if not sentinel:
+            status: bool = exit_status == 0
+
+        self.command     = command
+        self.stdout      = stdout
+        self.stderr      = stderr
+        self.status      = status
+        self.exit_status = exit_status
+        self.exit_signal = exit_signal
+        self.encoding    = encoding
+        self.errors      = errors
+
+        self.__output:       str = None
+        self.__output_lower: str = None
+        self.__stdout_text:  str = None
 
     def raise_if_error(self):
         if not self.status:
             raise SSHCommandError(f'({self.command}) {self.output}')
 
     @property
-    def status(self) -> bool:
-        return self.stdout[-8:] == b'4289077\n'
+    def output(self) -> str:
+        # Decoded once and cached, the slices are views, not copies.
+        if self.__output is None:
+            if not self.stderr:
+                self.__output = self.__stdout
+            else:
+                stdout: memoryview = self.__stdout_view
+                self.__output = str(
+                    b'\r\n'.join((stdout, self.stderr))
+                    if stdout else self.stderr,
+                    self.encoding, self.errors
+                )
+        return self.__output
 
     @property
-    def output(self) -> str:
-        output: bytes = self.stdout[:-9] if self.status else self.stdout
-        if self.stderr:
-            output: bytes = output + (
-                b'\r\n' if self.stdout else b''
-            ) + self.stderr
-        return output.decode()
+    def __stdout(self) -> str:
+        if self.__stdout_text is None:
+            self.__stdout_text = str(
+                self.__stdout_view, self.encoding, self.errors
+            )
+        return self.__stdout_text
+
+    @property
+    def __stdout_view(self) -> memoryview:
+        view = memoryview(self.stdout)
+        return view[:-1] if view[-1:] == b'\n' else view
 
     @property
     def status_output(self) -> tuple:
@@ -243,16 +2687,57 @@ class Command:
 
     def output_else_raise(self) -> str:
         self.raise_if_error()
-        return self.stdout[:-9].decode()
+        return self.__stdout
 
     def output_else_define(self, define=None):
         return self.output if self.status else define
 
+    @property
+    def spilled(self) -> bool:
+        return self.stdout.__class__ is mmap.mmap \
+            or self.stderr.__class__ is mmap.mmap
+
     def contain(self, string: str, *, ignore_case: bool = False) -> bool:
-        output: str = self.output
+        if self.spilled:
+            # Scan the mapped files without loading them.
+            return self.__scan(string, ignore_case)
         if ignore_case:
-            string, output = string.lower(), output.lower()
-        return string in output
+            if self.__output_lower is None:
+                self.__output_lower = self.output.lower()
+            return string.lower() in self.__output_lower
+        return string in self.output
+
+    def __scan(self, string: str, ignore_case: bool) -> bool:
+        # The output is joined as `output` does, then decoded (a bytes search
+        # is not a character search in every encoding) and lowered as
+        # `str.lower` does (a bytes pattern only folds ASCII) a chunk at a
+        # time. The tail of a chunk is searched again with the next one,
+        # lowering never shortens the text, so a match spans no more
+        # characters than it.
+        if ignore_case:
+            string: str = string.lower()
+        if not string:
+            return True
+        stdout: memoryview = self.__stdout_view
+        if not self.stderr:
+            parts: tuple = stdout,
+        elif stdout:
+            parts: tuple = stdout, b'\r\n', self.stderr
+        else:
+            parts: tuple = self.stderr,
+        size: int = 1 << 20
+        decoder = codecs.getincrementaldecoder(self.encoding)(self.errors)
+        tail: str = ''
+        for n, buffer in enumerate(parts, 1):
+            for i in range(0, len(buffer), size):
+                text: str = tail + decoder.decode(
+                    buffer[i:i + size],
+                    n == len(parts) and i + size >= len(buffer)
+                )
+                if string in (text.lower() if ignore_case else text):
+                    return True
+                tail: str = text[-len(string):]
+        return False
 
     def contain_string_else_raise(
             self, string: str, *, ignore_case: bool = False
@@ -261,22 +2746,866 @@ class Command:
             raise SSHCommandError(f'({self.command}): "{self.output}"')
 
     def output_if_contain_string_else_raise(self, string: str) -> str:
-        output = self.output
+        output: str = self.output
         if string in output:
             return output
-        raise SSHCommandError(f'({self.command}): "{self.output}"')
+        raise SSHCommandError(f'({self.command}): "{output}"')
 
     def table2dict(self, *, split: str = None):
-        lines = (
-            line.split(split) for line in self.output_else_raise().splitlines()
-        )
+        lines = self.line2list(split=split)
         titles = tuple(next(lines))
         return (dict(zip(titles, line)) for line in lines)
 
     def line2list(self, *, split: str = None):
-        yield from (
-            line.split(split) for line in self.output_else_raise().splitlines()
+        yield from (line.split(split) for line in self.__lines())
+
+    def table(
+            self,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False
+    ) -> 'Table':
+        return Table(
+            self.__lines(),
+            split      =split,
+            fixed_width=fixed_width,
+            convert    =convert
+        )
+
+    def __lines(self):
+        if self.stdout.__class__ is mmap.mmap:
+            self.raise_if_error()
+            return _iter_lines(self.stdout, self.encoding, self.errors)
+        return iter(self.output_else_raise().splitlines())
+
+
+class _Spool:
+
+    def __init__(self, max_memory: int):
+        self.max_memory = max_memory
+        self.chunks = []
+        self.size   = 0
+        self.file   = None
+
+    def write(self, chunk: bytes):
+        if self.file is not None:
+            self.file.write(chunk)
+            return
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.max_memory is not None and self.size > self.max_memory:
+            self.file = tempfile.TemporaryFile()
+            self.file.writelines(self.chunks)
+            self.chunks = None
+
+    def strip(self, suffix: bytes) -> bool:
+        # Drop `suffix` if the output ends with it, the file is truncated
+        # rather than its mapping sliced, which would load all of it.
+        if self.file is None:
+            value: bytes = b''.join(self.chunks)
+            found: bool = value.endswith(suffix)
+            self.chunks = [value[:-len(suffix)] if found else value]
+            return found
+        self.file.flush()
+        size: int = self.file.tell() - len(suffix)
+        if size < 0:
+            return False
+        self.file.seek(size)
+        if self.file.read() != suffix:
+            return False
+        self.file.truncate(size)
+        self.file.seek(size)
+        return True
+
+    def getvalue(self) -> (bytes, mmap.mmap):
+        if self.file is None:
+            return b''.join(self.chunks)
+        with self.file:
+            self.file.flush()
+            if not self.file.tell():
+                return b''  # An empty file cannot be mapped.
+            return mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _feed(channel: Channel, stdin, encoding: str) -> threading.Thread:
+    # Write `stdin` to the channel in a thread while the caller drains the
+    # output, `sendall` blocks while the remote window is full, so reading
+    # `stdin` is paced by the remote process. EOF is sent at the end.
+    if stdin.__class__ in (bytes, bytearray, memoryview, str):
+        if stdin.__class__ is str:
+            stdin = stdin.encode(encoding)
+        view = memoryview(stdin)
+        chunks = (
+            bytes(view[i:i + (1 << 18)]) for i in range(0, len(view), 1 << 18)
+        )
+    elif hasattr(stdin, 'read'):
+        chunks = iter(functools.partial(stdin.read, 1 << 18), None)
+        chunks = itertools.takewhile(bool, chunks)
+    else:
+        chunks = stdin
+
+    def feed():
+        try:
+            for chunk in chunks:
+                if chunk.__class__ is str:
+                    chunk = chunk.encode(encoding)
+                try:
+                    channel.sendall(chunk)
+                except OSError:
+                    # The remote process exited without reading all of it.
+                    return
+                thread.sent += len(chunk)
+            channel.shutdown_write()
+        except Exception as e:
+            # Do not let the remote process wait for input that never comes.
+            thread.error = e
+            channel.close()
+
+    thread = threading.Thread(target=feed, name='SSHStdinFeeder', daemon=True)
+    thread.error = None
+    thread.sent  = 0
+    thread.start()
+    return thread
+
+
+# name -> remote program, local decompressor, in order of preference.
+_COMPRESSORS = {
+    'zstd': (
+        'zstd -q -c', lambda: zstandard.ZstdDecompressor().decompressobj()
+    ),
+    'gzip': ('gzip -c', lambda: zlib.decompressobj(31))
+}
+
+
+def _compressed(command: str, program: str) -> str:
+    # Pipe the stdout of `command` through `program`, the exit status of
+    # the pipeline is that of `command` (POSIX sh has no "pipefail"): it is
+    # written to fd 3, captured by $(...), while the compressed output goes
+    # to the original stdout through fd 4. stderr is left as it is.
+    return (
+        f'{{ s=$( {{ {{ ( {command}\n) ; echo $? >&3; }} | {program} >&4; }} '
+        '3>&1 ); } 4>&1; exit $s'
+    )
+
+
+def _decompress(chunks, decompressor):
+    for fd, chunk in chunks:
+        if fd == 1:
+            chunk: bytes = decompressor.decompress(chunk)
+            if not chunk:
+                continue
+        yield fd, chunk
+    chunk: bytes = decompressor.flush()
+    if chunk:
+        yield 1, chunk
+
+
+def _spool(
+        channel:    Channel,
+        max_memory: int,
+        span:       'Span'     = None,
+        deadline:   'Deadline' = None,
+        decompressor           = None,
+        sentinel:   bool       = False
+) -> tuple:
+    # stdout and stderr are read together, a large stderr cannot fill the
+    # channel window while stdout is read. Output beyond `max_memory` is
+    # written to an unlinked temporary file, memory-mapped once finished.
+    # Return stdout, stderr, and with `sentinel` whether stdout ended with
+    # the sentinel line, which is dropped.
+    spools = {1: _Spool(max_memory), 2: _Spool(max_memory)}
+    chunks = _drain(channel, deadline=deadline)
+    if span is not None:
+        chunks = span.received(chunks)
+    if decompressor is not None:
+        chunks = _decompress(chunks, decompressor)
+    for fd, chunk in chunks:
+        spools[fd].write(chunk)
+    found: bool = sentinel and spools[1].strip(b'4289077\n')
+    return spools[1].getvalue(), spools[2].getvalue(), found
+
+
+def _iter_lines(buffer: mmap.mmap, encoding: str, errors: str):
+    start, end = 0, len(buffer)
+    while start < end:
+        stop: int = buffer.find(b'\n', start)
+        if stop == -1:
+            stop = end
+        yield str(buffer[start:stop].rstrip(b'\r'), encoding, errors)
+        start = stop + 1
+
+
+class CommandStream:
+
+    def __init__(
+            self,
+            command:  str,
+            channel:  Channel,
+            *,
+            encoding: str = 'utf-8',
+            errors:   str = 'strict',
+            decompressor   = None
+    ):
+        self.command      = command
+        self.channel      = channel
+        self.encoding     = encoding
+        self.errors       = errors
+        self.decompressor = decompressor
+
+    def __enter__(self) -> 'CommandStream':
+        return self
+
+    def __exit__(self, *a):
+        self.close()
+
+    def __iter__(self):
+        for fd, line in self.lines():
+            if fd == 1:
+                yield line
+
+    def close(self):
+        self.channel.close()
+
+    @property
+    def exit_status(self) -> int:
+        return self.channel.recv_exit_status()
+
+    @property
+    def exit_signal(self) -> str:
+        self.channel.status_event.wait()
+        return getattr(self.channel, 'exit_signal', None)
+
+    @property
+    def status(self) -> bool:
+        return self.exit_status == 0
+
+    def chunks(self, size: int = None):
+        if self.decompressor is None:
+            yield from _drain(self.channel, size)
+        else:
+            yield from _decompress(
+                _drain(self.channel, size), self.decompressor
+            )
+
+    def lines(self):
+        buffers = {1: b'', 2: b''}
+        for fd, chunk in self.chunks():
+            *lines, buffers[fd] = (buffers[fd] + chunk).split(b'\n')
+            for line in lines:
+                yield fd, str(line.rstrip(b'\r'), self.encoding, self.errors)
+        for fd, line in buffers.items():
+            if line:
+                yield fd, str(line.rstrip(b'\r'), self.encoding, self.errors)
+
+    def line2list(self, *, split: str = None):
+        yield from (line.split(split) for line in self.__stdout_lines())
+
+    def table2dict(self, *, split: str = None):
+        lines = self.line2list(split=split)
+        titles = tuple(next(lines, ()))
+        return (dict(zip(titles, line)) for line in lines)
+
+    def table(
+            self,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False
+    ) -> 'Table':
+        return Table(
+            self.__stdout_lines(),
+            split      =split,
+            fixed_width=fixed_width,
+            convert    =convert
+        )
+
+    def __stdout_lines(self):
+        stderr = []
+        for fd, line in self.lines():
+            if fd == 1:
+                yield line
+            else:
+                stderr.append(line)
+        if not self.status:
+            raise SSHCommandError(f'({self.command}) ' + '\n'.join(stderr))
+
+
+class Table:
+
+    def __init__(
+            self,
+            lines,
+            *,
+            split:       str  = None,
+            fixed_width: bool = None,
+            convert:     bool = False,
+            sample:      int  = 100
+    ):
+        lines = iter(lines)
+        header: str = next(lines, '')
+        rows: list = [
+            line for line in itertools.islice(lines, sample) if line.strip()
+        ]
+        self.__lines      = itertools.chain(rows, lines)
+        self.__rows       = rows
+        self.__bounds     = None
+        self.__parsed     = []
+        self.__converters = None
+        self.split        = split
+        self.convert      = convert
+
+        if split is not None:
+            self.columns = tuple(header.split(split))
+            return
+
+        tokens: list = [m.span() for m in re.finditer(r'\S+', header)]
+        if fixed_width is None and all(
+                len(row.split()) == len(tokens) for row in rows
+        ):
+            fixed_width = False
+        if fixed_width is not False and tokens:
+            self.columns, self.__bounds = self.__detect(header, tokens, rows)
+            # The whitespace split is several times faster, prefer it if it
+            # cuts the sampled rows the same way.
+            if fixed_width is None and all(
+                    row.split(None, len(self.columns) - 1) == self.__cut(row)
+                    for row in rows
+            ):
+                self.__bounds = None
+        else:
+            self.columns = tuple(header[a:b] for a, b in tokens)
+
+    def __iter__(self):
+        # The rows are parsed as they are first iterated over, and kept, the
+        # lines cannot be read again. An iterator that reaches the end of the
+        # kept rows parses the next line, for itself and the others.
+        if self.__converters is None:
+            # Each column is converted by the converter of the kind of its
+            # sampled cells, instead of trying every kind on every cell.
+            self.__converters = _converters(
+                len(self.columns), map(self.__cells, self.__rows)
+            ) if self.convert else []
+        converters, parsed = self.__converters, self.__parsed
+        cut, append = self.__cells, parsed.append
+        i: int = 0
+        while True:
+            if i < len(parsed):
+                yield parsed[i]
+                i += 1
+                continue
+            for line in self.__lines:
+                if not line.strip():
+                    continue
+                cells: list = cut(line)
+                if converters:
+                    for j, convert in converters:
+                        try:
+                            cells[j] = convert(cells[j])
+                        except (TypeError, ValueError):
+                            cells[j] = _convert(cells[j])
+                row = tuple(cells)
+                append(row)
+                i += 1
+                yield row
+                if i != len(parsed):
+                    # Another iterator went ahead meanwhile.
+                    break
+            else:
+                return
+
+    def __len__(self) -> int:
+        return len(self.__all())
+
+    def __getitem__(self, index):
+        return self.__all()[index]
+
+    def __all(self) -> list:
+        for _ in self:
+            pass
+        return self.__parsed
+
+    def __cells(self, line: str) -> list:
+        if self.__bounds is not None:
+            return self.__cut(line)
+        n: int = len(self.columns)
+        cells: list = line.split(self.split, n - 1)
+        if len(cells) < n:
+            cells += [None] * (n - len(cells))
+        return cells
+
+    def to_columns(self) -> dict:
+        columns = [[] for _ in self.columns]
+        appends = [column.append for column in columns]
+        for row in self:
+            for append, cell in zip(appends, row):
+                append(cell)
+        return dict(zip(self.columns, columns))
+
+    @staticmethod
+    def __detect(header: str, tokens: list, rows: list) -> tuple:
+        # Column boundaries are the positions between two header words that
+        # are blank in the header and every sampled row, header words with
+        # no such position between them belong to the same column.
+        width: int = max(len(line) for line in (header, *rows))
+        blank = bytearray(b'\x01') * width
+        for line in (header, *rows):
+            for m in re.finditer(r'\S+', line):
+                blank[m.start():m.end()] = bytes(m.end() - m.start())
+
+        columns, bounds, start = [], [], tokens[0][0]
+        for (_, end), (next_start, _) in zip(tokens, tokens[1:]):
+            gap: int = blank.rfind(1, end, next_start)
+            if gap != -1:
+                columns.append(header[start:end])
+                bounds.append(gap + 1)
+                start = next_start
+        columns.append(header[start:tokens[-1][1]])
+
+        return tuple(columns), bounds
+
+    def __cut(self, line: str) -> list:
+        cells, start = [], 0
+        for bound in self.__bounds:
+            # A cell wider than those sampled may cross the boundary, move
+            # the boundary to the nearest space.
+            if start < bound < len(line) and line[bound - 1] != ' ':
+                left: int = line.rfind(' ', start, bound)
+                right: int = line.find(' ', bound)
+                if right == -1:
+                    right = len(line)
+                if left != -1 and bound - left <= right - bound:
+                    right = left + 1
+                bound = right
+            cells.append(line[start:bound].strip() or None)
+            start = max(start, bound)
+        cells.append(line[start:].strip() or None)
+        return cells
+
+
+_SIZE = re.compile(r'(\d+(?:\.\d+)?)([KMGTPE])(?:i?B)?', re.IGNORECASE)
+
+
+def _convert(cell: str):
+    # "12" -> 12, "1.5" -> 1.5, "45%" -> 45.0, "1.5G" -> 1610612736
+    if not cell or cell[0] not in '0123456789.-+':
+        return cell
+    try:
+        return int(cell)
+    except ValueError:
+        pass
+    try:
+        return float(cell[:-1] if cell[-1] == '%' else cell)
+    except ValueError:
+        pass
+    try:
+        return _size(cell)
+    except ValueError:
+        return cell
+
+
+def _converters(n: int, rows) -> list:
+    # A column whose sampled cells are all of one kind gets the converter
+    # of that kind, a column of text is not converted, and a column of
+    # mixed kinds or with no sampled cell gets `_convert`. A cell that the
+    # converter of its column raises on is passed on to `_convert`.
+    kinds = [set() for _ in range(n)]
+    for cells in rows:
+        for kind, cell in zip(kinds, cells):
+            if cell:
+                kind.add(_kind(cell))
+    converters = []
+    for i, kind in enumerate(kinds):
+        if len(kind) != 1:
+            converters.append((i, _convert))
+        elif kind != {str}:
+            converters.append((i, kind.pop()))
+    return converters
+
+
+def _kind(cell: str):
+    # The converter of the kind of a cell, `str` for text.
+    value = _convert(cell)
+    if value.__class__ is str:
+        return str
+    if value.__class__ is float:
+        return _percent if cell[-1] == '%' else float
+    try:
+        int(cell)
+    except ValueError:
+        return _size
+    return int
+
+
+def _percent(cell: str) -> float:
+    return float(cell[:-1] if cell[-1:] == '%' else cell)
+
+
+def _size(cell: str) -> int:
+    m = _SIZE.fullmatch(cell)
+    if m is None:
+        raise ValueError(f'not a size: {cell!r}')
+    unit: int = 'KMGTPE'.index(m.group(2).upper()) + 1
+    return int(float(m.group(1)) * 1024 ** unit)
+
+
+class ShellSession:
+
+    def __init__(
+            self,
+            gobj:    'GqylpySSH',
+            *,
+            timeout: int  = None,
+            env:     dict = None
+    ):
+        self.gobj    = gobj
+        self.timeout = timeout or gobj.command_timeout
+        self.env     = env
+        self.channel: Channel = None
+        self.__open()
+
+    def __enter__(self) -> 'ShellSession':
+        return self
+
+    def __exit__(self, *a):
+        self.close()
+
+    def __open(self):
+        transport: Transport = self.gobj.get_transport()
+        if transport is None or not transport.is_active():
+            if not self.gobj.reconnect:
+                raise SSHException('SSH session not active')
+            self.gobj._connect()
+            transport: Transport = self.gobj.get_transport()
+        self.channel: Channel = transport.open_session()
+        if self.env:
+            self.channel.update_environment(self.env)
+        self.channel.invoke_shell()
+        self.__stdout = bytearray()
+        self.__stderr = bytearray()
+        self.__synced = True
+
+    def close(self):
+        self.channel.close()
+
+    def cmd(self, command: str, *, timeout: int = None) -> 'Command':
+        GqylpySSH._check(command, timeout, -1, None)
+
+        if not self.__synced and not self.resync():
+            self.channel.close()
+            self.__open()
+        if self.channel.closed or self.channel.eof_received:
+            self.__open()
+
+        command: str = self.gobj._prepare(command.strip())
+        marker: str = uuid.uuid4().hex
+        begin: bytes = f'GQYLPY-BEGIN-{marker}\n'.encode()
+        end: bytes = f'\nGQYLPY-END-{marker}'.encode()
+
+        # The command runs in the current shell so that the working directory
+        # and exported variables persist, stdin is detached to protect the
+        # commands that follow from being read by it.
+        self.channel.sendall((
+            f'printf "%s\\n" GQYLPY-BEGIN-{marker}\n'
+            f'printf "%s\\n" GQYLPY-BEGIN-{marker} >&2\n'
+            f'{{ {command}\n}} </dev/null\n'
+            f'printf "\\n%s %d\\n" GQYLPY-END-{marker} $?\n'
+            f'printf "\\n%s\\n" GQYLPY-END-{marker} >&2\n'
+        ).encode())
+
+        self.__synced = False
+        stdout, stderr, exit_status = self.__read(
+            begin, end + b' ', end + b'\n', timeout or self.timeout
         )
+        self.__synced = True
+
+        return Command(
+            command, stdout, stderr,
+            exit_status=exit_status,
+            encoding   =self.gobj.encoding,
+            errors     =self.gobj.encoding_errors
+        )
+
+    def resync(self, timeout: int = 5) -> bool:
+        marker: str = f'GQYLPY-SYNC-{uuid.uuid4().hex}'
+        self.channel.sendall((
+            f'\nprintf "%s\\n" {marker}\nprintf "%s\\n" {marker} >&2\n'
+        ).encode())
+        try:
+            self.__read(
+                b'', marker.encode(), marker.encode() + b'\n', timeout
+            )
+        except (socket.timeout, SSHException):
+            return False
+        self.__synced = True
+        return True
+
+    def __read(
+            self, begin: bytes, out_end: bytes, err_end: bytes, timeout: int
+    ) -> tuple:
+        self.channel.settimeout(timeout)
+        out, err = self.__stdout, self.__stderr
+        stdout = stderr = exit_status = None
+        # The index of `begin` once found, and where the next search starts,
+        # so each byte is searched about once however large the output.
+        out_i = err_i = -1
+        out_scan = err_scan = 0
+
+        for fd, chunk in _drain(self.channel):
+            if fd == 1:
+                out += chunk
+            else:
+                err += chunk
+            if stdout is None:
+                if out_i == -1:
+                    out_i, out_scan = _search(out, begin, out_scan)
+                    if out_i != -1:
+                        out_scan = out_i + len(begin)
+                if out_i != -1:
+                    j, out_scan = _search(out, out_end, out_scan)
+                    k: int = -1 if j == -1 \
+                        else out.find(b'\n', j + len(out_end))
+                    if k != -1:
+                        stdout: bytes = bytes(out[out_i + len(begin):j])
+                        status: bytes = out[j + len(out_end):k]
+                        exit_status: int = int(status) if status else None
+                        del out[:k + 1]
+            if stderr is None:
+                if err_i == -1:
+                    err_i, err_scan = _search(err, begin, err_scan)
+                    if err_i != -1:
+                        err_scan = err_i + len(begin)
+                if err_i != -1:
+                    j, err_scan = _search(err, err_end, err_scan)
+                    if j != -1:
+                        stderr: bytes = bytes(err[err_i + len(begin):j])
+                        del err[:j + len(err_end)]
+            if stdout is not None and stderr is not None:
+                return stdout, stderr, exit_status
+
+        raise SSHException('shell session closed by the remote side')
+
+
+def _search(buffer: bytearray, marker: bytes, start: int) -> tuple:
+    # The index of `marker` in `buffer` from `start` (-1 if not there yet),
+    # and where to search again once more bytes are appended.
+    i: int = buffer.find(marker, start)
+    if i == -1:
+        return -1, max(len(buffer) - len(marker) + 1, start)
+    return i, i
+
+
+def _readable(fds: list, timeout: float = None) -> list:
+    # The descriptors of `fds` ready to read within `timeout` seconds.
+    # `select.select` fails on a descriptor above FD_SETSIZE (1024), which
+    # a process talking to many hosts soon has, `poll` has no such limit.
+    # A descriptor closed meanwhile is reported ready (POLLNVAL).
+    if not hasattr(select, 'poll'):  # Windows
+        return select.select(fds, [], [], timeout)[0]
+    poll = select.poll()
+    for fd in fds:
+        poll.register(fd, select.POLLIN)
+    return [
+        fd for fd, _ in poll.poll(None if timeout is None else timeout * 1000)
+    ]
+
+
+def _drain(
+        channel:  Channel,
+        size:     int        = None,
+        deadline: 'Deadline' = None
+):
+    # Yield (1, stdout chunk) or (2, stderr chunk) as the data arrives, both
+    # buffers are drained together so neither side stalls the remote process.
+    if size is None:
+        size: int = _read_size(channel)
+    fd: int = channel.fileno()
+    timeout: float = channel.gettimeout()
+    while True:
+        if not (
+                channel.recv_ready() or channel.recv_stderr_ready()
+                or channel.eof_received or channel.closed
+        ):
+            if deadline is not None:
+                timeout: float = deadline.remaining(channel.gettimeout())
+            try:
+                ready: list = _readable([fd], timeout)
+            except (OSError, ValueError):
+                # The channel was closed by another thread meanwhile, its
+                # pipe is closed first, wait for `close` to release the lock.
+                with channel.lock:
+                    if not channel.closed:
+                        raise
+                ready: list = [fd]
+            if not ready:
+                if deadline is not None:
+                    deadline.check()
+                raise socket.timeout
+        while channel.recv_ready():
+            yield 1, channel.recv(size)
+        while channel.recv_stderr_ready():
+            yield 2, channel.recv_stderr(size)
+        if (channel.eof_received or channel.closed) and not (
+                channel.recv_ready() or channel.recv_stderr_ready()
+        ):
+            return
+
+
+class HostGroup:
+
+    def __init__(
+            self,
+            hosts:           (list, tuple),
+            *,
+            connect_workers: int = 16,
+            cmd_workers:     int = 64,
+            **params
+    ):
+        if hosts.__class__ not in (list, tuple):
+            x: str = hosts.__class__.__name__
+            raise TypeError(
+                'parameter "hosts" type must '
+                f'be a "list" or "tuple", not "{x}".'
+            )
+        for name, value in (
+                ('connect_workers', connect_workers),
+                ('cmd_workers', cmd_workers)
+        ):
+            if value.__class__ is not int or value < 1:
+                raise ValueError(
+                    f'parameter "{name}" must be a positive int, not {value!r}.'
+                )
+
+        self.cmd_workers = cmd_workers
+        self.gobjs:  list = []
+        self.errors: dict = {}
+
+        hostnames = []
+        for host in hosts:
+            if isinstance(host, GqylpySSH):
+                self.gobjs.append(host)
+            elif host.__class__ is str:
+                hostnames.append(host)
+            else:
+                x: str = host.__class__.__name__
+                raise TypeError(
+                    'element type of parameter "hosts" must be a '
+                    f'str or GqylpySSH instance, not "{x}".'
+                )
+
+        if hostnames:
+            with ThreadPoolExecutor(
+                    min(connect_workers, len(hostnames)),
+                    thread_name_prefix='GqylpySSHConnect'
+            ) as executor:
+                futures = [
+                    executor.submit(GqylpySSH, *self.__split(h), **params)
+                    for h in hostnames
+                ]
+                for hostname, future in zip(hostnames, futures):
+                    try:
+                        self.gobjs.append(future.result())
+                    except Exception as e:
+                        self.errors[hostname] = e
+
+        self.__executor = None
+
+    def __enter__(self) -> 'HostGroup':
+        return self
+
+    def __exit__(self, *a):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.gobjs)
+
+    def __len__(self) -> int:
+        return len(self.gobjs)
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+        for gobj in self.gobjs:
+            gobj.close()
+
+    def cmd(self, command: str, **kw):
+        yield from self.__fanout(GqylpySSH.cmd, command, **kw)
+
+    def cmd_many(self, commands: (tuple, list), **kw):
+        yield from self.__fanout(self.__cmd_many, commands, **kw)
+
+    def __fanout(self, method, *a, deadline=None, **kw):
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                min(self.cmd_workers, len(self.gobjs) or 1),
+                thread_name_prefix='GqylpySSHFanout'
+            )
+        deadline: Deadline = Deadline._get(deadline)
+        futures = {
+            self.__executor.submit(
+                method, gobj, *a, deadline=deadline, **kw
+            ): gobj for gobj in self.gobjs
+        }
+        # The hosts that failed to connect have no instance, they are yielded
+        # by hostname, a caller going through the results sees all the hosts.
+        yield from self.errors.items()
+        if deadline is None:
+            done = as_completed(futures)
+        else:
+            done = self.__until(futures, deadline)
+        for future in done:
+            if future.cancelled() or not future.done():
+                yield futures[future], socket.timeout(
+                    f'deadline of {deadline.seconds}s exceeded.'
+                )
+                continue
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+    @staticmethod
+    def __until(futures: dict, deadline: Deadline):
+        # The futures as they finish, those still running when the time is
+        # up are yielded last, not done.
+        pending = set(futures)
+        while pending:
+            done, pending = wait(
+                pending, deadline.remaining(), return_when=FIRST_COMPLETED
+            )
+            yield from done
+            if not done:
+                break
+        if pending:
+            # A host stuck out of the reads (e.g. connecting) does not keep
+            # the caller, and the channels in flight are closed so that the
+            # workers are released, with a second to return what finished.
+            for future in pending:
+                future.cancel()
+            deadline.cancel()
+            done, pending = wait(pending, 1)
+            yield from done
+            yield from pending
+
+    @staticmethod
+    def __cmd_many(gobj: GqylpySSH, commands: (tuple, list), **kw) -> list:
+        results = []
+        try:
+            for co in gobj.cmd_many(commands, **kw):
+                results.append(co)
+        except Exception as e:
+            # The commands finished before the failure, e.g. the deadline.
+            e.results = results
+            raise
+        return results
+
+    @staticmethod
+    def __split(host: str) -> tuple:
+        hostname, _, port = host.rpartition(':')
+        if hostname and port.isdigit() and ':' not in hostname:
+            return hostname, int(port)
+        return host, 22
 
 
 def gname2gobj(func):
@@ -316,10 +3645,37 @@ def cmd_many(commands: (tuple, list), *, gobj: GqylpySSH = None, **kw):
     return gobj.cmd_many(commands, **kw)
 
 
+@gname2gobj
+def cmd_mux(commands: (tuple, list), *, gobj: GqylpySSH = None, **kw):
+    return gobj.cmd_mux(commands, **kw)
+
+
+@gname2gobj
+def stream(command: str, *, gobj: GqylpySSH = None, **kw) -> CommandStream:
+    return gobj.stream(command, **kw)
+
+
+@gname2gobj
+def put(local: str, remote: str, *, gobj: GqylpySSH = None, **kw) -> int:
+    return gobj.put(local, remote, **kw)
+
+
+@gname2gobj
+def get(remote: str, local: str, *, gobj: GqylpySSH = None, **kw) -> int:
+    return gobj.get(remote, local, **kw)
+
+
+@gname2gobj
+def sync(
+        local_dir: str, remote_dir: str, *, gobj: GqylpySSH = None, **kw
+) -> SyncReport:
+    return gobj.sync(local_dir, remote_dir, **kw)
+
+
 @gname2gobj
 def cmd_async(
         command: str, *, gobj: GqylpySSH = None, **kw
-) -> threading.Thread:
+) -> Future:
     return gobj.cmd_async(command, **kw)
 
 
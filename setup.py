@@ -27,6 +27,7 @@ setuptools.setup(
     install_requires=[str(x) for x in pkg_resources.parse_requirements(
         open('requirements.txt', encoding='utf8')
     )],
+    extras_require={'zstd': ['zstandard']},
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',